@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: Toplevel_results.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Paranoid comparison results window. Only the visible rows
+#              live in the Treeview, every scroll fetches one page from the
+#              comparison table, filters and sorting run as indexed SQL
+#              queries and pages are read by key (the row after the last
+#              one seen), so the window opens instantly for any result size.
+#
+import csv
+import tkinter as tk
+import tkinter.ttk as ttk
+from tkinter import filedialog
+
+COLUMNS = ('status', 'rel', 'album', 'format')
+HEADINGS = {'status': 'Status', 'rel': 'File', 'album': 'Album', 'format': 'Format'}
+WIDTHS = {'status': 80, 'rel': 420, 'album': 260, 'format': 60}
+STATUSES = ('all', 'mismatch', 'missing', 'extra', 'moved-from', 'moved-to')
+
+
+class Toplevel_results:
+    def __init__(self, top, connection):
+        '''top is the toplevel containing window, connection an open
+           sqlite3 connection holding the comparison table.'''
+        top.geometry("900x520")
+        top.minsize(400, 200)
+        top.title("Paranoid Comparison Results")
+
+        self.top = top
+        self.connection = connection
+        # position of the page: the sort key of its first row (None at the
+        # top) and its row number, the row number only drives the scrollbar
+        self.first = None
+        self.offset = 0
+        self.total = 0
+        self.sort = 'rel'
+        # the filters and order of the shown result, set by refresh()
+        self.where, self.params, self.order = '', [], ('rel',)
+
+        # filter bar
+        bar = ttk.Frame(self.top)
+        bar.pack(side='top', fill='x', padx=4, pady=4)
+        ttk.Label(bar, text='Status').pack(side='left')
+        self.status = ttk.Combobox(bar, values=STATUSES, width=10, state='readonly')
+        self.status.set('all')
+        self.status.pack(side='left', padx=4)
+        ttk.Label(bar, text='Album').pack(side='left')
+        self.album = ttk.Entry(bar, width=30)
+        self.album.pack(side='left', padx=4)
+        ttk.Label(bar, text='Format').pack(side='left')
+        self.format = ttk.Combobox(bar, values=self._formats(), width=8, state='readonly')
+        self.format.set('all')
+        self.format.pack(side='left', padx=4)
+        ttk.Button(bar, text='Export CSV', command=self.export_csv).pack(side='right')
+        self.count_label = ttk.Label(bar, text='')
+        self.count_label.pack(side='right', padx=8)
+
+        self.status.bind('<<ComboboxSelected>>', lambda event: self.refresh())
+        self.format.bind('<<ComboboxSelected>>', lambda event: self.refresh())
+        self.album.bind('<Return>', lambda event: self.refresh())
+
+        # the tree holds one page only, the scrollbar maps onto the whole result
+        body = ttk.Frame(self.top)
+        body.pack(side='top', fill='both', expand=True)
+        self.tree = ttk.Treeview(body, columns=COLUMNS, show='headings', selectmode='browse')
+        for column in COLUMNS:
+            self.tree.heading(column, text=HEADINGS[column], command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=WIDTHS[column], stretch=column in ('rel', 'album'))
+        self.scrollbar = ttk.Scrollbar(body, orient='vertical', command=self.on_scroll)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+
+        self.tree.bind('<Configure>', lambda event: self.render())
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll(-1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-1, 'units'))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(1, 'units'))
+        self.top.bind('<Prior>', lambda event: self.scroll(-1, 'pages'))
+        self.top.bind('<Next>', lambda event: self.scroll(1, 'pages'))
+
+        self.refresh()
+
+    def _formats(self):
+        return ('all',) + tuple(row[0] for row in self.connection.execute(
+            "SELECT DISTINCT format FROM comparison ORDER BY format"))
+
+    def _where(self):
+        clauses, params = [], []
+        if self.status.get() != 'all':
+            clauses.append('status = ?')
+            params.append(self.status.get())
+        if self.format.get() != 'all':
+            clauses.append('format = ?')
+            params.append(self.format.get())
+        album = self.album.get().strip()
+        if album:
+            # prefix match as a range, so the album index is used
+            clauses.append('album >= ? AND album < ?')
+            params += [album, album + '\uffff']
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _order(self):
+        # every filter and sort combination has its index (paranoid.py):
+        # a column fixed by a filter sorts by rel, the album prefix range
+        # only goes along with sorting by album
+        if self.album.get().strip():
+            return ('album', 'rel')
+        if self.sort == 'rel' or (self.sort in ('status', 'format') and getattr(self, self.sort).get() != 'all'):
+            return ('rel',)
+        return (self.sort, 'rel')
+
+    def _fetch(self, key, op, limit, skip=0, descending=False):
+        # limit rows whose sort key compares op to key, in sort order
+        # (descending: backwards from key)
+        order, where, params = self.order, self.where, self.params
+        if key is not None:
+            where += (' AND ' if where else ' WHERE ') + \
+                f"({', '.join(order)}) {op} ({', '.join('?' * len(order))})"
+            params = params + list(key)
+        direction = ' DESC' if descending else ''
+        return self.connection.execute(
+            f"SELECT status, rel, album, format FROM comparison{where} "
+            f"ORDER BY {', '.join(column + direction for column in order)} LIMIT ? OFFSET ?",
+            params + [limit, skip]).fetchall()
+
+    def _key(self, row):
+        return tuple(row[COLUMNS.index(column)] for column in self.order)
+
+    def _forward(self, step):
+        step = min(step, max(0, self.total - self.page_size() - self.offset))
+        if step:
+            row = self._fetch(self.first, '>=', 1, skip=step)
+            if row:
+                self.first = self._key(row[0])
+                self.offset += step
+
+    def _back(self, step):
+        if step >= self.offset:
+            self.first, self.offset = None, 0
+            return
+        row = self._fetch(self.first, '<', 1, skip=step - 1, descending=True)
+        if row:
+            self.first = self._key(row[0])
+            self.offset -= step
+        else:
+            self.first, self.offset = None, 0
+
+    def page_size(self):
+        # rows that fit in the tree, minus the heading row
+        rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        return max(1, self.tree.winfo_height() // rowheight - 1)
+
+    def refresh(self):
+        self.where, self.params = self._where()
+        self.order = self._order()
+        self.total = self.connection.execute("SELECT count(*) FROM comparison" + self.where,
+                                             self.params).fetchone()[0]
+        self.count_label['text'] = f"{self.total} rows"
+        self.first, self.offset = None, 0
+        self.render()
+
+    def render(self):
+        rows = self.page_size()
+        if self.offset > self.total - rows:
+            # the window grew at the end of the result
+            self._back(self.offset - max(0, self.total - rows))
+        page = self._fetch(self.first, '>=', rows)
+        self.tree.delete(*self.tree.get_children())
+        for row in page:
+            self.tree.insert('', 'end', values=row)
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, min(1.0, (self.offset + rows) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, amount, what):
+        step = int(amount) * (self.page_size() if what == 'pages' else 1)
+        if step > 0:
+            self._forward(step)
+        elif step < 0:
+            self._back(-step)
+        self.render()
+
+    def on_scroll(self, *args):
+        if args[0] == 'moveto':
+            # a jump to a scrollbar position is the one lookup by row number
+            offset = max(0, min(int(float(args[1]) * self.total), self.total - self.page_size()))
+            row = self._fetch(None, None, 1, skip=offset) if offset else []
+            self.first, self.offset = (self._key(row[0]), offset) if row else (None, 0)
+            self.render()
+        elif args[0] == 'scroll':
+            self.scroll(args[1], args[2])
+
+    def sort_by(self, column):
+        self.sort = column
+        self.refresh()
+
+    def export_csv(self):
+        file_path = filedialog.asksaveasfilename(parent=self.top, defaultextension='.csv',
+                                                 filetypes=(('CSV files', '*.csv'), ('all files', '*.*')))
+        if not file_path:
+            return
+        rows = self.connection.execute(
+            "SELECT status, rel, album, format, source_chksum, dest_chksum FROM comparison"
+            f"{self.where} ORDER BY {', '.join(self.order)}", self.params)
+        # streamed straight from the cursor to the file
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('status', 'file', 'album', 'format', 'source_chksum', 'dest_chksum'))
+            writer.writerows(rows)
+
+
+def show_results(root, connection):
+    """Open the results window, connection is closed with the window."""
+    top = tk.Toplevel(root)
+    results = Toplevel_results(top, connection)
+
+    def close():
+        connection.close()
+        top.destroy()
+
+    top.protocol('WM_DELETE_WINDOW', close)
+    return results
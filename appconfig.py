@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: appconfig.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Configuration service. musiclibmanager.ini is parsed and
+#              validated once into frozen, typed records (the only place
+#              holding the defaults), cached by the file mtime and size; a
+#              bad value is reported at startup with the section and key
+#              instead of failing in the middle of a scan.
+#
+#   python3 appconfig.py musiclibmanager.ini
+#
+import configparser
+import hashlib
+import os
+import shlex
+import string
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from library import filetype_matcher
+
+INI = 'musiclibmanager.ini'
+TRUE = ('1', 'true', 'yes', 'on')
+FALSE = ('0', 'false', 'no', 'off')
+LOGLEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+# sections that are not file formats
+APP_SECTIONS = ('APP', 'LIBRARY', 'COVER', 'MANIFEST', 'METRICS', 'IOSCHED', 'THROTTLE',
+                'MERKLE', 'CACHE', 'FINGERPRINT', 'STRUCTCHECK', 'SCRUB', 'SYNC', 'INGEST', 'DISTRIBUTED')
+
+# placeholders each command template may use
+COMMAND_FIELDS = {'verify': {'filename'},
+                  'convertwav': {'filename', 'output'},
+                  'convertpipe': {'filename'}}
+
+
+class ConfigError(ValueError):
+    """The ini file is missing or holds invalid values, errors lists them all."""
+
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors
+        super().__init__(f"{path}: " + '; '.join(errors))
+
+
+# immutable, typed records, one per section; LibrarySettings also carries
+# the derived artifacts of the hot paths: the filetypes plus cover image
+# names as one pattern string and its compiled matcher
+AppSettings = namedtuple('AppSettings', 'logfile loglevel logperfile logmaxsize logbackups')
+LibrarySettings = namedtuple('LibrarySettings', 'location filetypes checksumtype checksumtable scanfiletypes match')
+CoverSettings = namedtuple('CoverSettings', 'imagetype imagenames imageminsize')
+FormatSettings = namedtuple('FormatSettings', 'lossless verify convertwav convertpipe audiominresolution')
+ManifestSettings = namedtuple('ManifestSettings', 'name style batchsize workersperdevice')
+MerkleSettings = namedtuple('MerkleSettings', 'enabled chunksize')
+SyncSettings = namedtuple('SyncSettings', 'workers method')
+IngestSettings = namedtuple('IngestSettings', 'workers verify')
+MetricsSettings = namedtuple('MetricsSettings', 'interval file format')
+IoschedSettings = namedtuple('IoschedSettings', 'profile window hddinflight ssdinflight')
+ThrottleSettings = namedtuple('ThrottleSettings', 'mbps filesps idle latencyms maxdelayms')
+CacheSettings = namedtuple('CacheSettings', 'enabled identity')
+FingerprintSettings = namedtuple('FingerprintSettings', 'start seconds workers similarity maxber')
+StructcheckSettings = namedtuple('StructcheckSettings', 'samples workers')
+# percent, gigabytes and maxhours are None when unused
+ScrubSettings = namedtuple('ScrubSettings', 'windowdays percent gigabytes maxhours')
+# nodes are the 'http://host:port/path[=libpath]' specs (distributed.parse_node)
+DistributedSettings = namedtuple('DistributedSettings', 'port token timeout nodes')
+Settings = namedtuple('Settings', 'path app library cover formats manifest merkle sync ingest metrics '
+                                  'iosched throttle cache fingerprint structcheck scrub distributed')
+
+
+class _Reader:
+    """Typed accessors over a ConfigParser, collecting every error."""
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.errors = []
+
+    def _value(self, section, key, default):
+        if self.parser.has_option(section, key):
+            return self.parser.get(section, key).strip()
+        if default is None:
+            self.errors.append(f"[{section}] {key} is missing")
+            return ''
+        return default
+
+    def text(self, section, key, default=None):
+        return self._value(section, key, default)
+
+    def choice(self, section, key, choices, default=None):
+        value = self._value(section, key, default)
+        if value.lower() not in choices:
+            self.errors.append(f"[{section}] {key}={value!r}, expected one of {', '.join(choices)}")
+        return value.lower()
+
+    def boolean(self, section, key, default=None):
+        value = self._value(section, key, default).lower()
+        if value not in TRUE + FALSE:
+            self.errors.append(f"[{section}] {key}={value!r} is not a boolean")
+        return value in TRUE
+
+    def number(self, section, key, default=None, kind=int, minimum=0, optional=False):
+        """int or float >= minimum; optional values may be empty (None)."""
+        value = self._value(section, key, default)
+        if optional and not value:
+            return None
+        try:
+            number = kind(value)
+        except ValueError:
+            self.errors.append(f"[{section}] {key}={value!r} is not a number")
+            return kind(minimum)
+        if number < minimum:
+            self.errors.append(f"[{section}] {key}={value!r} is below {minimum}")
+        return number
+
+    def size(self, section, key, default=None):
+        """'500x500' as (500, 500)."""
+        value = self._value(section, key, default)
+        width, x, height = value.lower().partition('x')
+        if not (x and width.strip().isdigit() and height.strip().isdigit()):
+            self.errors.append(f"[{section}] {key}={value!r} is not WIDTHxHEIGHT")
+            return (0, 0)
+        return (int(width), int(height))
+
+    def patterns(self, section, key, default=None):
+        value = self._value(section, key, default)
+        return tuple(p.strip() for p in value.split(',') if p.strip())
+
+    def command(self, section, key):
+        """A command template, checked for quoting and unknown placeholders."""
+        value = self._value(section, key, '')
+        if not value:
+            return ''
+        try:
+            fields = {field for arg in shlex.split(value)
+                      for _, field, _, _ in string.Formatter().parse(arg) if field is not None}
+        except ValueError as error:
+            self.errors.append(f"[{section}] {key}: {error}")
+            return value
+        unknown = fields - COMMAND_FIELDS[key]
+        if unknown:
+            self.errors.append(f"[{section}] {key} uses unknown placeholders {sorted(unknown)}")
+        return value
+
+
+def parse_config(path=INI):
+    """Read and validate path, returns Settings or raises ConfigError."""
+    parser = configparser.ConfigParser()
+    try:
+        with open(path, encoding='utf-8') as f:
+            parser.read_file(f)
+    except (OSError, configparser.Error) as error:
+        raise ConfigError(path, [str(error)]) from None
+    r = _Reader(parser)
+
+    app = AppSettings(logfile=r.text('APP', 'logfile'),
+                      loglevel=r.choice('APP', 'loglevel', tuple(l.lower() for l in LOGLEVELS),
+                                        'WARNING').upper(),
+                      logperfile=r.boolean('APP', 'logperfile', 'false'),
+                      logmaxsize=r.number('APP', 'logmaxsize', '10485760'),
+                      logbackups=r.number('APP', 'logbackups', '5'))
+
+    cover = CoverSettings(imagetype=r.choice('COVER', 'imagetype', ('internal', 'external', 'mixed'), 'mixed'),
+                          imagenames=r.patterns('COVER', 'imagenames', ''),
+                          imageminsize=r.size('COVER', 'imageminsize', '0x0'))
+
+    filetypes = r.patterns('LIBRARY', 'filetypes')
+    if not filetypes:
+        r.errors.append("[LIBRARY] filetypes is empty")
+    checksumtype = r.text('LIBRARY', 'checksumtype', 'sha256')
+    # checked by name, checksum.hash_constructor() resolves it when hashing
+    if checksumtype.removesuffix('()').lower() not in hashlib.algorithms_available:
+        r.errors.append(f"[LIBRARY] checksumtype={checksumtype!r} is not a hashlib algorithm")
+    scanfiletypes = ','.join(filetypes + cover.imagenames)
+    library = LibrarySettings(location=r.text('LIBRARY', 'location'),
+                              filetypes=filetypes,
+                              checksumtype=checksumtype,
+                              checksumtable=r.text('LIBRARY', 'checksumtable'),
+                              scanfiletypes=scanfiletypes,
+                              match=filetype_matcher(scanfiletypes))
+
+    # every other section holding a lossless flag or a command is a format
+    formats = {}
+    for section in parser.sections():
+        if section in APP_SECTIONS or not any(parser.has_option(section, key) for key in ('lossless', *COMMAND_FIELDS)):
+            continue
+        formats[section] = FormatSettings(lossless=r.boolean(section, 'lossless', 'false'),
+                                          verify=r.command(section, 'verify'),
+                                          convertwav=r.command(section, 'convertwav'),
+                                          convertpipe=r.command(section, 'convertpipe'),
+                                          audiominresolution=r.number(section, 'audiominresolution', '0'))
+
+    manifest = ManifestSettings(name=r.text('MANIFEST', 'name', 'checksums'),
+                                style=r.choice('MANIFEST', 'style', ('gnu', 'bsd'), 'gnu'),
+                                batchsize=r.number('MANIFEST', 'batchsize', '10000', minimum=1),
+                                workersperdevice=r.number('MANIFEST', 'workersperdevice', '2', minimum=1))
+    merkle = MerkleSettings(enabled=r.boolean('MERKLE', 'enabled', 'false'),
+                            chunksize=r.number('MERKLE', 'chunksize', '4194304', minimum=4096))
+    sync = SyncSettings(workers=r.number('SYNC', 'workers', '4', minimum=1),
+                        method=r.choice('SYNC', 'method', ('tee', 'zerocopy'), 'tee'))
+    ingest = IngestSettings(workers=r.number('INGEST', 'workers', '4', minimum=1),
+                            verify=r.boolean('INGEST', 'verify', 'true'))
+
+    metrics = MetricsSettings(interval=r.number('METRICS', 'interval', '30', float, minimum=1),
+                              file=r.text('METRICS', 'file', '') or None,
+                              format=r.choice('METRICS', 'format', ('prometheus', 'json'), 'prometheus'))
+    iosched = IoschedSettings(profile=r.choice('IOSCHED', 'profile', ('auto', 'hdd', 'ssd', 'off'), 'auto'),
+                              window=r.number('IOSCHED', 'window', '10000', minimum=1),
+                              hddinflight=r.number('IOSCHED', 'hddinflight', '1', minimum=1),
+                              ssdinflight=r.number('IOSCHED', 'ssdinflight', '8', minimum=1))
+    throttle = ThrottleSettings(mbps=r.number('THROTTLE', 'mbps', '0', float),
+                                filesps=r.number('THROTTLE', 'filesps', '0', float),
+                                idle=r.boolean('THROTTLE', 'idle', 'false'),
+                                latencyms=r.number('THROTTLE', 'latencyms', '0', float),
+                                maxdelayms=r.number('THROTTLE', 'maxdelayms', '500', float))
+    cache = CacheSettings(enabled=r.boolean('CACHE', 'enabled', 'false'),
+                          identity=r.choice('CACHE', 'identity', ('inode', 'extents'), 'inode'))
+    fingerprint = FingerprintSettings(start=r.number('FINGERPRINT', 'start', '30', float),
+                                      seconds=r.number('FINGERPRINT', 'seconds', '15', float, minimum=1),
+                                      workers=r.number('FINGERPRINT', 'workers', '0'),
+                                      similarity=r.number('FINGERPRINT', 'similarity', '0.85', float),
+                                      maxber=r.number('FINGERPRINT', 'maxber', '0.35', float))
+    for key in ('similarity', 'maxber'):
+        if getattr(fingerprint, key) > 1:
+            r.errors.append(f"[FINGERPRINT] {key} must be between 0 and 1")
+    structcheck = StructcheckSettings(samples=r.number('STRUCTCHECK', 'samples', '16'),
+                                      workers=r.number('STRUCTCHECK', 'workers', '0'))
+    scrub = ScrubSettings(windowdays=r.number('SCRUB', 'windowdays', '30', float, minimum=1),
+                          percent=r.number('SCRUB', 'percent', '', float, optional=True),
+                          gigabytes=r.number('SCRUB', 'gigabytes', '', float, optional=True),
+                          maxhours=r.number('SCRUB', 'maxhours', '', float, optional=True))
+    distributed = DistributedSettings(port=r.number('DISTRIBUTED', 'port', '8765', minimum=1),
+                                      token=r.text('DISTRIBUTED', 'token', ''),
+                                      timeout=r.number('DISTRIBUTED', 'timeout', '600', float, minimum=1),
+                                      nodes=r.patterns('DISTRIBUTED', 'nodes', ''))
+    for spec in distributed.nodes:
+        url, _, libpath = spec.partition('=')
+        if not url.startswith('http://') or url.count('/') < 3:
+            r.errors.append(f"[DISTRIBUTED] node {spec!r} is not http://host:port/path[=libpath]")
+
+    if r.errors:
+        raise ConfigError(path, r.errors)
+    return Settings(path=path, app=app, library=library, cover=cover,
+                    formats=MappingProxyType(formats), manifest=manifest, merkle=merkle,
+                    sync=sync, ingest=ingest, metrics=metrics, iosched=iosched, throttle=throttle,
+                    cache=cache, fingerprint=fingerprint, structcheck=structcheck, scrub=scrub,
+                    distributed=distributed)
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def load_config(path=INI):
+    """Return the Settings of path, parsed again only when the file changed.
+
+    The cache key is the file mtime (ns) and size, so editing the ini file
+    while the application runs takes effect on the next menu action.
+    Raises ConfigError; callers holding a good Settings can keep using it.
+    """
+    try:
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+    except OSError as error:
+        raise ConfigError(path, [str(error)]) from None
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        settings = parse_config(path)
+        _cache[path] = (key, settings)
+        return settings
+
+
+if __name__ == '__main__':
+    import sys
+
+    ini = sys.argv[1] if len(sys.argv) > 1 else INI
+    try:
+        settings = parse_config(ini)
+    except ConfigError as error:
+        for message in error.errors:
+            print(f"{ini}: {message}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{ini}: ok (formats {', '.join(settings.formats)})")
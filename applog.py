@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: applog.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Application logging, set up once. Records go through a queue
+#              to a listener thread that owns the (rotating) log file, so a
+#              slow disk never blocks the hashing path.
+#
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# per file detail (one line per hashed file) goes to this logger, it is
+# only enabled when [APP] logperfile is true
+FILES_LOGGER = 'musiclibmanager.files'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+
+def setup_logging(app):
+    """Configure the root logger from the [APP] settings (appconfig.AppSettings).
+
+    Only the first call does anything, later calls return the same
+    listener. loglevel sets the level, logmaxsize and logbackups the size
+    based rotation.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = getattr(logging, app.loglevel, logging.WARNING)
+    file_handler = logging.handlers.RotatingFileHandler(app.logfile,
+                                                        maxBytes=app.logmaxsize,
+                                                        backupCount=app.logbackups,
+                                                        encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    # unbounded queue: put_nowait never blocks the caller
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    files = logging.getLogger(FILES_LOGGER)
+    if app.logperfile:
+        files.setLevel(logging.DEBUG)
+    else:
+        files.disabled = True
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
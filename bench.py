@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: bench.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Benchmark of the scan, hash, persist and compare stages on a
+#              synthetic music library. Results are appended as one JSON
+#              line per run so regressions can be tracked over time.
+#
+#   python3 bench.py --albums 50 --tracks 12 --scale 0.05 --output bench.jsonl
+#
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+
+from checksum import hash_files, default_workers
+from library import scan_files
+from paranoid import compare_checksums
+
+MB = 1024 * 1024
+# median file size (MB) and spread of the lognormal size distribution
+SIZES = {
+    '.flac': (28.0, 0.35),
+    '.dsf': (160.0, 0.30),
+    '.mp3': (8.0, 0.30),
+}
+COVERS = {'cover.jpg': 0.4, 'folder.jpg': 0.15}
+CHECKSUMTABLE = ('CREATE TABLE IF NOT EXISTS "checksum" ("libpath" TEXT NOT NULL,"file" TEXT NOT NULL,'
+                 '"chksumtype" TEXT NOT NULL,"chksum" TEXT NOT NULL, PRIMARY KEY("file"))')
+INSERT = "INSERT INTO checksum (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)"
+
+
+def _write_file(file_path, size, block):
+    with open(file_path, 'wb') as f:
+        # a unique head keeps every file's digest different
+        f.write(os.urandom(64))
+        size -= 64
+        while size > 0:
+            f.write(block[:min(size, len(block))])
+            size -= len(block)
+
+
+def generate_library(libpath, albums, tracks, formats, scale, seed=0):
+    """Create a synthetic library, returns (file_count, total_bytes).
+
+    Every album holds `tracks` files of one format (round robin over
+    formats) with lognormal sizes scaled by `scale`, plus cover.jpg and
+    folder.jpg.
+    """
+    rnd = random.Random(seed)
+    block = os.urandom(MB)
+    count, total = 0, 0
+    for a in range(albums):
+        ext = formats[a % len(formats)]
+        median, sigma = SIZES[ext]
+        album_dir = os.path.join(libpath, f"Artist {a % 17:02d}", f"Album {a:04d} ({1970 + a % 50})")
+        os.makedirs(album_dir, exist_ok=True)
+        files = [(f"{t + 1:02d}. Track{ext}", rnd.lognormvariate(0, sigma) * median) for t in range(tracks)]
+        files += list(COVERS.items())
+        for filename, size in files:
+            size = max(128, int(size * scale * MB))
+            _write_file(os.path.join(album_dir, filename), size, block)
+            count += 1
+            total += size
+    return count, total
+
+
+def drop_cache(file_paths):
+    # posix_fadvise does not need root, unlike /proc/sys/vm/drop_caches
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for file_path in file_paths:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def _stage(name, seconds, files, nbytes=None):
+    result = {'stage': name, 'seconds': round(seconds, 6), 'files': files,
+              'files_per_s': round(files / seconds, 1) if seconds else None}
+    if nbytes is not None:
+        result['bytes'] = nbytes
+        result['mb_per_s'] = round(nbytes / MB / seconds, 2) if seconds else None
+    return result
+
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix='musiclib-bench-', dir=args.tmpdir) as tmp:
+        libpath = os.path.join(tmp, 'library')
+        count, total = generate_library(libpath, args.albums, args.tracks,
+                                        ['.' + f.strip('.') for f in args.formats.split(',')],
+                                        args.scale, args.seed)
+        stages = []
+
+        start = time.perf_counter()
+        files = list(scan_files(libpath, args.filetypes))
+        stages.append(_stage('scan', time.perf_counter() - start, len(files)))
+
+        cold = not args.warm and drop_cache(files)
+        start = time.perf_counter()
+        rows, nbytes = [], 0
+        for file_path, chksum, error in hash_files(files, args.checksumtype, args.workers):
+            if error is None:
+                rows.append((libpath, file_path, args.checksumtype, chksum))
+                nbytes += os.path.getsize(file_path)
+        stages.append(_stage('hash', time.perf_counter() - start, len(rows), nbytes))
+
+        connection = sqlite3.connect(os.path.join(tmp, 'paranoid.db'))
+        cursor = connection.cursor()
+        cursor.execute(CHECKSUMTABLE)
+
+        # one commit per row, as Calc CheckSums does today
+        start = time.perf_counter()
+        for row in rows:
+            cursor.execute(INSERT, row)
+            connection.commit()
+        stages.append(_stage('persist_row', time.perf_counter() - start, len(rows)))
+
+        destination = libpath + '-copy'
+        copy = [(destination, destination + f[len(libpath):], t, c) for _, f, t, c in rows]
+        start = time.perf_counter()
+        cursor.executemany(INSERT, copy)
+        connection.commit()
+        stages.append(_stage('persist_batch', time.perf_counter() - start, len(copy)))
+
+        # damage one percent of the copy so the compare has work to report
+        damaged = copy[::100]
+        cursor.executemany("UPDATE checksum SET chksum = 'bad' WHERE file = ?", [(r[1],) for r in damaged])
+        connection.commit()
+        start = time.perf_counter()
+        differences = sum(1 for _ in compare_checksums(cursor, libpath, destination))
+        stages.append(_stage('compare', time.perf_counter() - start, len(rows) * 2))
+        connection.close()
+        if differences != len(damaged):
+            raise RuntimeError(f"compare found {differences} differences, expected {len(damaged)}")
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {'albums': args.albums, 'tracks': args.tracks, 'formats': args.formats,
+                   'scale': args.scale, 'checksumtype': args.checksumtype,
+                   'workers': args.workers or default_workers(), 'cold_cache': cold},
+        'library': {'files': count, 'bytes': total},
+        'stages': stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the musiclibmanager checksum pipeline.')
+    parser.add_argument('--albums', type=int, default=20)
+    parser.add_argument('--tracks', type=int, default=10)
+    parser.add_argument('--formats', default='flac,dsf,mp3')
+    parser.add_argument('--scale', type=float, default=0.02,
+                        help='multiplier applied to realistic file sizes (1.0 = full size)')
+    parser.add_argument('--filetypes', default='*.flac,*.dsf,*.mp3,cover.jpg,folder.jpg')
+    parser.add_argument('--checksumtype', default='sha256')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warm', action='store_true', help='do not evict the files from the page cache')
+    parser.add_argument('--tmpdir', default=None, help='where the synthetic library is created')
+    parser.add_argument('--output', default=None, help='append the JSON result to this file')
+    args = parser.parse_args()
+
+    result = run(args)
+    line = json.dumps(result)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
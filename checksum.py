@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: checksum.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Checksum engine, hashes music files in parallel
+#
+import functools
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# read size per call, big reads keep the syscall count low on DSD files
+BLOCKSIZE = 1024 * 1024
+# shake_128/shake_256 need an explicit digest length (in bytes)
+SHAKE_LENGTH = 32
+
+
+@functools.lru_cache(maxsize=None)
+def hash_constructor(checksumtype):
+    """Return the hashlib constructor of a [LIBRARY] checksumtype value.
+
+    The ini file lists the algorithms as 'sha256()', so a trailing '()'
+    is accepted as well as the plain name. The named constructors
+    (hashlib.sha256) skip the lookup hashlib.new() does on every call.
+    Raises ValueError for an unknown algorithm.
+    """
+    name = checksumtype.strip().removesuffix('()').lower()
+    constructor = getattr(hashlib, name, None)
+    if constructor is None or name not in hashlib.algorithms_available:
+        hashlib.new(name)  # ValueError, or an OpenSSL-only algorithm
+        return functools.partial(hashlib.new, name)
+    return constructor
+
+
+def new_hash(checksumtype):
+    """Return a new hashlib object for a [LIBRARY] checksumtype value."""
+    return hash_constructor(checksumtype)()
+
+
+def hex_digest(hash_obj):
+    if hash_obj.name.startswith('shake_'):
+        return hash_obj.hexdigest(SHAKE_LENGTH)
+    return hash_obj.hexdigest()
+
+
+def raw_digest(hash_obj):
+    if hash_obj.name.startswith('shake_'):
+        return hash_obj.digest(SHAKE_LENGTH)
+    return hash_obj.digest()
+
+
+def default_workers():
+    # hashlib releases the GIL on large updates, so threads scale with cores
+    return os.cpu_count() or 1
+
+
+def get_file_hash(file_path, checksumtype='sha256', blocksize=BLOCKSIZE, metrics=None, throttle=None,
+                  leaves=None, chunksize=None):
+    """Calculate the checksum of a single file, returns the hex digest.
+
+    When a metrics.Metrics is given the time spent reading and hashing is
+    recorded separately, together with the bytes read per device. A
+    throttle.Throttle is told about every read and may sleep. When leaves
+    is a list, the raw digest of every chunksize chunk of the file is
+    appended to it in the same pass (see merkle.py).
+    """
+    hash_obj = new_hash(checksumtype)
+    buffer = bytearray(blocksize)
+    view = memoryview(buffer)
+    leaf, leaf_size = None, 0
+    if leaves is not None:
+        leaf = new_hash(checksumtype)
+    with open(file_path, 'rb', buffering=0) as f:
+        if metrics is None and throttle is None and leaf is None:
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hash_obj.update(view[:size])
+            return hex_digest(hash_obj)
+
+        clock = time.perf_counter
+        read_time, hash_time, throttle_time, nbytes = 0.0, 0.0, 0.0, 0
+        while True:
+            start = clock()
+            size = f.readinto(buffer)
+            latency = clock() - start
+            read_time += latency
+            if not size:
+                break
+            if throttle is not None:
+                throttle_time += throttle.read(size, latency)
+            start = clock()
+            hash_obj.update(view[:size])
+            offset = 0
+            while leaf is not None and offset < size:
+                part = min(size - offset, chunksize - leaf_size)
+                leaf.update(view[offset:offset + part])
+                offset += part
+                leaf_size += part
+                if leaf_size == chunksize:
+                    leaves.append(raw_digest(leaf))
+                    leaf, leaf_size = new_hash(checksumtype), 0
+            hash_time += clock() - start
+            nbytes += size
+        if leaf_size:
+            leaves.append(raw_digest(leaf))
+        if metrics is not None:
+            metrics.add_time('read', read_time)
+            metrics.add_time('hash', hash_time)
+            metrics.add_time('throttle', throttle_time)
+            metrics.count('bytes_read', nbytes)
+            metrics.count('files')
+            metrics.device_read(os.fstat(f.fileno()).st_dev, nbytes, read_time)
+    return hex_digest(hash_obj)
+
+
+def _hash_one(file_path, checksumtype, blocksize, metrics=None, submitted=None, scheduler=None,
+              throttle=None, chunksize=None):
+    if metrics is not None:
+        metrics.add_time('queue_wait', time.perf_counter() - submitted)
+    leaves = [] if chunksize else None
+    try:
+        if throttle is not None:
+            slept = throttle.start_file()
+            if metrics is not None:
+                metrics.add_time('throttle', slept)
+        if scheduler is None:
+            chksum = get_file_hash(file_path, checksumtype, blocksize, metrics, throttle, leaves, chunksize)
+        else:
+            start = time.perf_counter()
+            with scheduler.slot(file_path) as profile:
+                if metrics is not None:
+                    metrics.add_time('device_wait', time.perf_counter() - start)
+                chksum = get_file_hash(file_path, checksumtype, profile.blocksize, metrics, throttle,
+                                       leaves, chunksize)
+        result = file_path, chksum, None
+    except OSError as error:
+        if metrics is not None:
+            metrics.count('errors')
+        result = file_path, None, error
+    return result if leaves is None else result + (leaves,)
+
+
+def hash_files(file_paths, checksumtype='sha256', workers=None, blocksize=BLOCKSIZE, metrics=None,
+               scheduler=None, throttle=None, chunksize=None, cache=None):
+    """Hash an iterable of files in a thread pool.
+
+    Yields (file_path, chksum, error) tuples in completion order, error is
+    None when the checksum was calculated. Only a few files per worker are
+    in flight at any time, so file_paths can be a generator over millions
+    of files. metrics (a metrics.Metrics) collects the engine timers.
+
+    scheduler (an iosched.IOScheduler) orders the files and caps the reads
+    in flight per device, its profile also sets the block size. throttle
+    (a throttle.Throttle) limits the rate of the workers. With chunksize
+    the tuples get a fourth item, the list of chunk digests (merkle.py).
+
+    cache (a hashcache.ContentCache) is asked before a file is read: hits
+    are yielded straight away, new digests are added to it. It is not
+    used together with chunksize, whose leaves are only known after a read.
+    """
+    workers = workers or default_workers()
+    if chunksize:
+        cache = None
+    pending = set()
+    paths = iter(file_paths if scheduler is None else scheduler.order(file_paths))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers * 4:
+                file_path = next(paths, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                if cache is not None:
+                    chksum = cache.lookup(file_path)
+                    if chksum is not None:
+                        if scheduler is not None:
+                            scheduler.forget(file_path)
+                        if metrics is not None:
+                            metrics.count('cache_hits')
+                        yield file_path, chksum, None
+                        continue
+                pending.add(executor.submit(_hash_one, file_path, checksumtype, blocksize,
+                                            metrics, time.perf_counter(), scheduler, throttle,
+                                            chunksize))
+            if not pending:
+                break
+            start = time.perf_counter()
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if metrics is not None:
+                metrics.add_time('result_wait', time.perf_counter() - start)
+            for future in done:
+                result = future.result()
+                if cache is not None:
+                    if result[2] is None:
+                        cache.store(result[0], result[1])
+                    else:
+                        cache.discard(result[0])
+                yield result
+    if cache is not None:
+        cache.flush()
+
+
+def hash_files_ordered(file_paths, checksumtype='sha256', workers=None, blocksize=BLOCKSIZE, metrics=None,
+                       throttle=None):
+    """Like hash_files() but the results come back in input order.
+
+    At most a few files per worker are read ahead, so memory stays
+    constant however long file_paths is (used by streaming compares).
+    """
+    workers = workers or default_workers()
+    pending = deque()
+    paths = iter(file_paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < workers * 4:
+                file_path = next(paths, None)
+                if file_path is None:
+                    break
+                pending.append(executor.submit(_hash_one, file_path, checksumtype, blocksize,
+                                               metrics, time.perf_counter(), None, throttle))
+            if not pending:
+                break
+            yield pending.popleft().result()
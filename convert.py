@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: convert.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Conversion jobs built on the [FLAC]/[MP3] convertwav
+#              templates. Every job writes to its own temporary file (renamed
+#              when the decoder succeeds), jobs run one decoder process per
+#              core, and convertpipe templates stream the WAV through a pipe
+#              without touching the disk.
+#
+#   python3 convert.py /tmp/wav /mnt/music/Album/*.flac
+#
+import itertools
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from library import format_command
+
+# the original templates wrote to a fixed output.wav
+LEGACY_OUTPUT = 'output.wav'
+_job_numbers = itertools.count()
+
+
+def format_settings(formats, file_path):
+    """The appconfig.FormatSettings of file_path's [FLAC]/[MP3]/... section, or None.
+
+    formats is Settings.formats."""
+    return formats.get(os.path.splitext(file_path)[1].lstrip('.').upper())
+
+
+def convert_command(formats, file_path, output):
+    """Return the convertwav command of file_path writing to output, or None."""
+    settings = format_settings(formats, file_path)
+    template = settings.convertwav if settings else ''
+    if not template:
+        return None
+    command = format_command(template, filename=file_path, output=output)
+    return [output if arg == LEGACY_OUTPUT else arg for arg in command]
+
+
+def open_decoder(formats, file_path):
+    """Start the convertpipe decoder of file_path, the WAV comes on its stdout.
+
+    Returns a subprocess.Popen (the caller reads stdout and waits), or None
+    when the format has no convertpipe template.
+    """
+    settings = format_settings(formats, file_path)
+    template = settings.convertpipe if settings else ''
+    if not template:
+        return None
+    return subprocess.Popen(format_command(template, filename=file_path),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def output_path(file_path, output_dir, source=None, keep_extension=False):
+    """<output_dir>/<path relative to source>.wav (flat when source is None).
+
+    keep_extension gives <name>.flac.wav instead of <name>.wav."""
+    rel = os.path.relpath(file_path, source) if source else os.path.basename(file_path)
+    return os.path.join(output_dir, (rel if keep_extension else os.path.splitext(rel)[0]) + '.wav')
+
+
+def plan_jobs(formats, file_paths, output_dir, source=None):
+    """Return (jobs, skipped) for convert_files().
+
+    Files of a format without a convertwav template are skipped. Files
+    that would write the same WAV (01.flac and 01.mp3 of one album) keep
+    their extension in the name (01.flac.wav, 01.mp3.wav); a file whose
+    output is still taken is skipped. skipped holds (file_path, reason).
+    """
+    skipped = []
+    by_output = {}
+    for file_path in file_paths:
+        settings = format_settings(formats, file_path)
+        if not (settings and settings.convertwav):
+            skipped.append((file_path, 'no convertwav template'))
+            continue
+        by_output.setdefault(output_path(file_path, output_dir, source), []).append(file_path)
+    jobs = []
+    owners = {}
+    for output, paths in by_output.items():
+        if len(paths) > 1:
+            candidates = [(file_path, output_path(file_path, output_dir, source, keep_extension=True))
+                          for file_path in paths]
+        else:
+            candidates = [(paths[0], output)]
+        for file_path, candidate in candidates:
+            if candidate in owners:
+                skipped.append((file_path, f"same output as {owners[candidate]}"))
+                continue
+            owners[candidate] = file_path
+            jobs.append((file_path, candidate))
+    return jobs, skipped
+
+
+def convert_file(formats, file_path, output):
+    """Decode file_path into output. Returns None or the error text."""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    # unique per job, so any number of decoders can run side by side
+    tmp = f"{output}.{os.getpid()}-{next(_job_numbers)}.tmp.wav"
+    command = convert_command(formats, file_path, tmp)
+    if command is None:
+        return f"no convertwav template for {file_path}"
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as error:
+        return str(error)
+    if result.returncode or not os.path.exists(tmp):
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        return result.stderr.decode('utf-8', 'replace').strip() or f"exit code {result.returncode}"
+    os.replace(tmp, output)
+    return None
+
+
+def convert_files(formats, jobs, workers=None):
+    """Run (file_path, output) jobs, one decoder process per worker.
+
+    workers defaults to the number of cores. Yields (file_path, output,
+    error) as jobs finish, error is None on success; callers use it to
+    drive a progress bar.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_file, formats, file_path, output): (file_path, output)
+                   for file_path, output in jobs}
+        for future in as_completed(futures):
+            file_path, output = futures[future]
+            yield file_path, output, future.result()
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from appconfig import ConfigError, load_config
+
+    parser = argparse.ArgumentParser(description='Convert music files to WAV in parallel.')
+    parser.add_argument('output_dir')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--ini', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      'musiclibmanager.ini'))
+    args = parser.parse_args()
+
+    try:
+        formats = load_config(args.ini).formats
+    except ConfigError as error:
+        sys.exit(str(error))
+    jobs, skipped = plan_jobs(formats, args.files, args.output_dir)
+    for file_path, reason in skipped:
+        print(f"SKIPPED {file_path}: {reason}", file=sys.stderr)
+    failed = 0
+    for done, (file_path, output, error) in enumerate(convert_files(formats, jobs, args.workers), 1):
+        if error:
+            failed += 1
+            print(f"[{done}/{len(jobs)}] FAILED {file_path}: {error}", file=sys.stderr)
+        else:
+            print(f"[{done}/{len(jobs)}] {output}")
+    sys.exit(1 if failed or skipped else 0)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: distributed.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Distributed checksums. A worker runs on every storage node
+#              and hashes its local disks with the checksum engine; the
+#              coordinator asks all nodes at once and writes the streamed
+#              rows into one paranoid.db, so the throughput grows with the
+#              number of nodes instead of being capped by one network link.
+#
+#   on every NAS:  python3 distributed.py worker --root /srv/music --bind 0.0.0.0
+#   coordinator:   python3 distributed.py collect http://nas1:8765/srv/music=/mnt/nas1/music
+#
+# Protocol: GET /hash?root=<path on the node>&checksumtype=sha256 answers
+# with one JSON object per line, {"rel": ..., "chksum": ..., "error": ...}
+# per file and a final {"done": <files>}; a stream without the final line
+# was cut off. When a token is set it is sent in the X-Musiclib-Token header.
+#
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PORT = 8765
+TOKEN_HEADER = 'X-Musiclib-Token'
+# seconds without a line from a node before it is given up (a throttled
+# node hashing a big DSF file can be silent for minutes)
+TIMEOUT = 600
+# rows of the nodes still streaming, moved to checksum when a node is done
+STAGINGTABLE = ('CREATE TEMP TABLE IF NOT EXISTS "checksum_staging" ("libpath" TEXT NOT NULL, '
+                '"file" TEXT NOT NULL, "chksumtype" TEXT NOT NULL, "chksum" TEXT NOT NULL)')
+STAGE = "INSERT INTO checksum_staging (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)"
+
+
+class NodeError(Exception):
+    """A node could not be reached or its stream was cut off."""
+
+
+# worker #
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.0: the end of the stream is the end of the connection
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if server.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), server.token):
+            self.send_error(403, 'bad token')
+            return
+        if url.path != '/hash' or 'root' not in query:
+            self.send_error(404, 'use /hash?root=<path>')
+            return
+        root = os.path.realpath(query['root'][0])
+        if not any(root == allowed or root.startswith(allowed + os.sep) for allowed in server.roots):
+            self.send_error(403, 'root not served by this worker')
+            return
+        checksumtype = query.get('checksumtype', ['sha256'])[0]
+        try:
+            from checksum import hash_constructor
+            hash_constructor(checksumtype)
+        except ValueError:
+            self.send_error(400, f"unknown checksumtype {checksumtype}")
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            count = 0
+            for rel, chksum, error in hash_tree(root, server.filetypes, checksumtype,
+                                                server.workers, server.scheduler, server.throttle):
+                self.wfile.write(json.dumps({'rel': rel, 'chksum': chksum, 'error': error}).encode() + b'\n')
+                count += 1
+            self.wfile.write(json.dumps({'done': count}).encode() + b'\n')
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(f"Coordinator went away while hashing {root}")
+
+
+def hash_tree(root, filetypes, checksumtype='sha256', workers=None, scheduler=None, throttle=None):
+    """Hash the files below root, yields (relative_path, chksum, error).
+
+    Relative paths use '/' whatever the node's platform, the coordinator
+    joins them to its own name of the tree.
+    """
+    from checksum import hash_files
+    from library import scan_files
+
+    for file_path, chksum, error in hash_files(scan_files(root, filetypes), checksumtype, workers,
+                                               scheduler=scheduler, throttle=throttle):
+        rel = os.path.relpath(file_path, root).replace(os.sep, '/')
+        yield rel, chksum, str(error) if error else None
+
+
+def make_worker(roots, filetypes, bind='127.0.0.1', port=PORT, token='', workers=None,
+                scheduler=None, throttle=None):
+    """Create the worker HTTP server (call serve_forever()), serving the
+    trees below roots only."""
+    server = ThreadingHTTPServer((bind, port), _Handler)
+    server.daemon_threads = True
+    server.roots = [os.path.realpath(root) for root in roots]
+    server.filetypes = filetypes
+    server.token = token
+    server.workers = workers
+    server.scheduler = scheduler
+    server.throttle = throttle
+    return server
+
+
+# coordinator #
+
+def parse_node(spec):
+    """'http://nas1:8765/srv/music=/mnt/nas1/music' as (url, remote_root, libpath).
+
+    remote_root is the tree as the node sees it, libpath the name the
+    rows get in paranoid.db (usually where the coordinator mounts it).
+    Without '=libpath' the remote path is used.
+    """
+    url, _, libpath = spec.partition('=')
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme != 'http' or not parts.netloc or not parts.path:
+        raise ValueError(f"node {spec!r} is not http://host:port/path[=libpath]")
+    base = f"http://{parts.netloc}"
+    return base, parts.path, libpath or parts.path
+
+
+def fetch_node(base, remote_root, checksumtype='sha256', token='', timeout=TIMEOUT):
+    """Yield (relative_path, chksum, error) streamed by one worker.
+
+    Raises NodeError when the node is unreachable, is silent for more
+    than timeout seconds or the stream ends before its final line.
+    """
+    query = urllib.parse.urlencode({'root': remote_root, 'checksumtype': checksumtype})
+    request = urllib.request.Request(f"{base}/hash?{query}")
+    if token:
+        request.add_header(TOKEN_HEADER, token)
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except OSError as error:
+        raise NodeError(f"{base}: {error}") from None
+    with response:
+        try:
+            for line in response:
+                row = json.loads(line)
+                if 'done' in row:
+                    return
+                yield row['rel'], row['chksum'], row['error']
+        except (OSError, ValueError) as error:
+            raise NodeError(f"{base}: {error}") from None
+    raise NodeError(f"{base}: stream cut off")
+
+
+def collect(cursor, nodes, checksumtype='sha256', token='', batchsize=1000, timeout=TIMEOUT):
+    """Hash all nodes in parallel into the checksum table of cursor.
+
+    nodes are (url, remote_root, libpath) from parse_node(). The rows of
+    a node go to a staging table first and replace the previous rows of
+    its libpath once its stream ended with the final line, so a node that
+    fails keeps its last good snapshot. One reader thread per node feeds a
+    queue, this thread is the only sqlite writer and inserts in batches.
+    timeout is the longest wait, in seconds, for the next line of a node.
+    Yields (libpath, file, error) for every file that failed and
+    (libpath, None, error) for a node that failed.
+    """
+    rows = queue.Queue(maxsize=batchsize * 4)
+    finished = object()
+
+    def reader(base, remote_root, libpath):
+        try:
+            for rel, chksum, error in fetch_node(base, remote_root, checksumtype, token, timeout):
+                rows.put((libpath, rel, chksum, error))
+            # complete
+            rows.put((libpath, None, None, None))
+        except NodeError as error:
+            rows.put((libpath, None, None, str(error)))
+        finally:
+            rows.put(finished)
+
+    def flush(batch):
+        cursor.executemany(STAGE, batch)
+        cursor.connection.commit()
+        return []
+
+    cursor.execute(STAGINGTABLE)
+    cursor.execute("DELETE FROM checksum_staging")
+    threads = [threading.Thread(target=reader, args=node, daemon=True) for node in nodes]
+    for thread in threads:
+        thread.start()
+
+    running, batch = len(threads), []
+    while running:
+        try:
+            item = rows.get(timeout=1.0)
+        except queue.Empty:
+            # the nodes are slow, don't hold the rows back
+            item = None
+        if item is finished:
+            running -= 1
+        elif item is not None:
+            libpath, rel, chksum, error = item
+            if rel is None:
+                batch = flush(batch)
+                if error:
+                    yield libpath, None, error
+                else:
+                    cursor.execute("DELETE FROM checksum WHERE libpath = ?", (libpath,))
+                    cursor.execute("INSERT OR REPLACE INTO checksum (libpath,file,chksumtype,chksum) "
+                                   "SELECT libpath, file, chksumtype, chksum FROM checksum_staging "
+                                   "WHERE libpath = ?", (libpath,))
+                cursor.execute("DELETE FROM checksum_staging WHERE libpath = ?", (libpath,))
+                cursor.connection.commit()
+                continue
+            file_path = os.path.join(libpath, *rel.split('/'))
+            if error:
+                yield libpath, file_path, error
+            else:
+                batch.append((libpath, file_path, checksumtype, chksum))
+        if batch and (item is None or len(batch) >= batchsize):
+            batch = flush(batch)
+
+
+def nodes_from_config(settings):
+    """The nodes of the [DISTRIBUTED] settings (appconfig.DistributedSettings)
+    parsed by parse_node()."""
+    return [parse_node(spec) for spec in settings.nodes]
+
+
+if __name__ == '__main__':
+    import argparse
+    import sqlite3
+    import sys
+
+    from appconfig import ConfigError, load_config
+    from applog import setup_logging
+
+    parser = argparse.ArgumentParser(description='Distributed checksums over several storage nodes.')
+    parser.add_argument('--ini', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      'musiclibmanager.ini'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker = commands.add_parser('worker', help='serve the local trees to a coordinator')
+    worker.add_argument('--root', action='append', required=True, help='tree served (repeatable)')
+    worker.add_argument('--bind', default='127.0.0.1')
+    worker.add_argument('--port', type=int, default=None)
+    worker.add_argument('--workers', type=int, default=None)
+    coordinator = commands.add_parser('collect', help='hash the nodes into paranoid.db')
+    coordinator.add_argument('nodes', nargs='*', help='http://host:port/remote/path[=libpath], '
+                                                      'default [DISTRIBUTED] nodes')
+    coordinator.add_argument('--db', default='./data/paranoid.db')
+    args = parser.parse_args()
+
+    try:
+        settings = load_config(args.ini)
+    except ConfigError as error:
+        sys.exit(str(error))
+    section = settings.distributed
+    # [APP] logging as the other tools; a relative logfile is next to the ini,
+    # where scrub.py and the GUI write it
+    setup_logging(settings.app._replace(logfile=os.path.join(os.path.dirname(os.path.abspath(args.ini)),
+                                                             settings.app.logfile)))
+
+    if args.command == 'worker':
+        from iosched import scheduler_from_config
+        from throttle import throttle_from_config
+        server = make_worker(args.root, settings.library.scanfiletypes, args.bind,
+                             args.port or section.port, section.token, args.workers,
+                             scheduler_from_config(settings.iosched), throttle_from_config(settings.throttle))
+        logger.info(f"Worker serving {', '.join(server.roots)} on {args.bind}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    nodes = [parse_node(spec) for spec in args.nodes] or nodes_from_config(section)
+    if not nodes:
+        sys.exit('no nodes given and [DISTRIBUTED] nodes is empty')
+    connection = sqlite3.connect(args.db)
+    cursor = connection.cursor()
+    cursor.execute(settings.library.checksumtable)
+    failed = 0
+    for libpath, file_path, error in collect(cursor, nodes, settings.library.checksumtype, section.token,
+                                             timeout=section.timeout):
+        failed += 1
+        print(f"FAILED {file_path or libpath}: {error}", file=sys.stderr)
+    for base, remote_root, libpath in nodes:
+        count = cursor.execute("SELECT count(*) FROM checksum WHERE libpath = ?", (libpath,)).fetchone()[0]
+        print(f"{libpath}: {count} checksums")
+    connection.close()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: fingerprint.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Near-duplicate audio detection. A short segment of every
+#              track is decoded through the [FLAC]/[MP3] convertpipe
+#              templates and turned into a spectral fingerprint (NumPy).
+#              Locality sensitive hashing finds the tracks that sound the
+#              same, so an album ripped twice or kept as FLAC and MP3 shows
+#              up even though the files differ byte for byte.
+#
+#              NumPy is optional, it is only needed for this stage:
+#              pip install numpy
+#
+#   python3 fingerprint.py /mnt/music
+#
+import itertools
+import logging
+import math
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from convert import open_decoder
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINTTABLE = ('CREATE TABLE IF NOT EXISTS "fingerprints" ("file" TEXT NOT NULL, "size" INTEGER NOT NULL, '
+                    '"mtime_ns" INTEGER NOT NULL, "vector" BLOB NOT NULL, "bits" BLOB NOT NULL, '
+                    '"version" INTEGER NOT NULL DEFAULT 0, PRIMARY KEY("file"))')
+INSERT = "INSERT OR REPLACE INTO fingerprints (file,size,mtime_ns,vector,bits,version) VALUES (?, ?, ?, ?, ?, ?)"
+# rows of another version are computed again (1: fixed analysis rate)
+VERSION = 1
+# every segment is resampled to one analysis rate first, so a 96 kHz FLAC
+# and its 44.1 kHz MP3 get the same frames and bands: frames of 1024
+# samples (93 ms), 64 per second; 33 log spaced bands between 300 and
+# 2000 Hz give 32 bits per frame (Haitsma-Kalker)
+ANALYSIS_RATE = 11025
+FRAME = 1024
+FRAMES_PER_SECOND = 64
+BANDS = 33
+LOW_HZ, HIGH_HZ = 300.0, 2000.0
+# the summary vector: band energies averaged over 16 time slots
+TIME_SLOTS = 16
+READ_SIZE = 1024 * 1024
+
+
+class FingerprintError(Exception):
+    """A track could not be decoded or fingerprinted."""
+
+
+def require_numpy():
+    if np is None:
+        raise FingerprintError("audio fingerprints need NumPy (pip install numpy)")
+
+
+# decoding #
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise FingerprintError("truncated WAV stream")
+    return data
+
+
+def read_wav_segment(stream, start=30.0, seconds=15.0):
+    """Read seconds of audio from start out of a WAV stream (a pipe, so
+    nothing is seeked and the data size of the header is ignored).
+
+    Tracks shorter than start + seconds give their last seconds. Returns
+    (rate, mono float32 samples).
+    """
+    require_numpy()
+    header = _read_exact(stream, 12)
+    if header[:4] != b'RIFF' or header[8:] != b'WAVE':
+        raise FingerprintError("decoder output is not a WAV stream")
+    fmt = None
+    while True:
+        chunk_id, size = struct.unpack('<4sI', _read_exact(stream, 8))
+        if chunk_id == b'data':
+            break
+        body = _read_exact(stream, size + (size & 1))
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', body[:16])
+            if fmt[0] == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE, the sub format follows
+                fmt = struct.unpack('<H', body[24:26]) + fmt[1:]
+    if fmt is None:
+        raise FingerprintError("WAV stream without fmt chunk")
+    tag, channels, rate, _, align, bits = fmt
+    width = bits // 8
+    # PCM of 1 to 4 bytes, IEEE float of 4 or 8 bytes
+    if width not in {1: (1, 2, 3, 4), 3: (4, 8)}.get(tag, ()) or align != channels * width:
+        raise FingerprintError(f"unsupported WAV format {tag}/{bits} bits")
+
+    # keep only the last wanted bytes of what was read
+    wanted = int(seconds * rate) * align
+    total = int((start + seconds) * rate) * align
+    buffer, read = bytearray(), 0
+    while read < total:
+        data = stream.read(min(READ_SIZE, total - read))
+        if not data:
+            break
+        read += len(data)
+        buffer += data
+        if len(buffer) > 2 * wanted:
+            del buffer[:len(buffer) - wanted]
+    del buffer[:max(0, len(buffer) - wanted)]
+    # realign on a sample frame boundary
+    del buffer[:(len(buffer) - read) % align]
+    del buffer[len(buffer) - len(buffer) % align:]
+
+    raw = np.frombuffer(bytes(buffer), dtype=np.uint8)
+    if tag == 3:
+        samples = raw.view('<f4' if width == 4 else '<f8').astype(np.float32)
+    elif width == 1:
+        samples = (raw.astype(np.float32) - 128) / 128
+    elif width == 3:
+        triplets = raw.reshape(-1, 3).astype(np.int32)
+        samples = ((triplets[:, 0] | triplets[:, 1] << 8 | triplets[:, 2] << 16) << 8 >> 8).astype(np.float32) / 2 ** 23
+    else:
+        samples = raw.view('<i2' if width == 2 else '<i4').astype(np.float32) / 2 ** (bits - 1)
+    return rate, samples.reshape(-1, channels).mean(axis=1)
+
+
+def decode_segment(formats, file_path, start=30.0, seconds=15.0):
+    """Decode a segment of file_path with its convertpipe template
+    (formats is appconfig Settings.formats)."""
+    try:
+        decoder = open_decoder(formats, file_path)
+    except OSError as error:
+        raise FingerprintError(str(error)) from None
+    if decoder is None:
+        raise FingerprintError(f"no convertpipe template for {os.path.splitext(file_path)[1]}")
+    try:
+        return read_wav_segment(decoder.stdout, start, seconds)
+    finally:
+        # the rest of the track is not needed
+        decoder.stdout.close()
+        decoder.kill()
+        decoder.wait()
+
+
+# fingerprints #
+
+def resample(rate, samples, target=ANALYSIS_RATE):
+    """Resample samples from rate to target (band limited, in the
+    frequency domain)."""
+    require_numpy()
+    if rate == target or not len(samples):
+        return samples
+    size = max(1, int(round(len(samples) * target / rate)))
+    spectrum = np.fft.rfft(samples)[:size // 2 + 1]
+    return (np.fft.irfft(spectrum, size) * (size / len(samples))).astype(np.float32)
+
+
+def _band_edges():
+    # FFT bins of 10.8 Hz: the narrowest band (300 Hz) is still 1.6 bins
+    # wide, reduceat needs at least one bin per band
+    return np.round(np.geomspace(LOW_HZ, HIGH_HZ, BANDS + 1) * FRAME / ANALYSIS_RATE).astype(int)
+
+
+def fingerprint(rate, samples):
+    """Return (vector, bits) of a mono segment.
+
+    The segment is resampled to ANALYSIS_RATE first. bits holds one 32 bit
+    sub-fingerprint per frame (sign of the band energy differences over
+    time and frequency), vector the unit length log band energies of
+    TIME_SLOTS slots, used for the LSH index.
+    """
+    require_numpy()
+    samples = resample(rate, samples)
+    hop = ANALYSIS_RATE // FRAMES_PER_SECOND
+    if len(samples) < FRAME + hop * TIME_SLOTS * 2:
+        raise FingerprintError("segment too short")
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME)[::hop]
+    power = np.abs(np.fft.rfft(frames * np.hanning(FRAME).astype(np.float32), axis=1)) ** 2
+    edges = _band_edges()
+    energy = np.add.reduceat(power[:, edges[0]:edges[-1]], edges[:-1] - edges[0], axis=1)
+
+    difference = np.diff(energy, axis=1)
+    bits = np.packbits(difference[1:] - difference[:-1] > 0, axis=1, bitorder='little').view('<u4').ravel()
+
+    # a floor relative to the mean keeps near silent bands from dominating,
+    # removing the band means drops static EQ and noise floor differences
+    slots = np.log(energy + 1e-3 * energy.mean() + 1e-12)
+    slots = slots[:len(slots) - len(slots) % TIME_SLOTS].reshape(TIME_SLOTS, -1, BANDS).mean(axis=1)
+    vector = (slots - slots.mean(axis=0)).ravel()
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype(np.float32), bits
+
+
+def bit_error_rate(bits_a, bits_b, max_shift=8):
+    """Lowest share of differing bits between two fingerprints, over
+    shifts of up to max_shift frames (encoder delay, rip offsets)."""
+    best = 1.0
+    for shift in range(-max_shift, max_shift + 1):
+        a = bits_a[max(0, shift):]
+        b = bits_b[max(0, -shift):]
+        size = min(len(a), len(b))
+        if size:
+            best = min(best, np.unpackbits((a[:size] ^ b[:size]).view(np.uint8)).mean())
+    return float(best)
+
+
+def _fingerprint_file(formats, file_path, start, seconds):
+    try:
+        st = os.stat(file_path)
+        vector, bits = fingerprint(*decode_segment(formats, file_path, start, seconds))
+    except (OSError, FingerprintError) as error:
+        return file_path, None, str(error)
+    return file_path, (st.st_size, st.st_mtime_ns, vector.tobytes(), bits.tobytes(), VERSION), None
+
+
+def ensure_table(cursor):
+    """Create the fingerprints table; tables of earlier versions get the
+    version column (their rows are version 0)."""
+    cursor.execute(FINGERPRINTTABLE)
+    if 'version' not in {row[1] for row in cursor.execute('PRAGMA table_info("fingerprints")')}:
+        cursor.execute('ALTER TABLE "fingerprints" ADD COLUMN "version" INTEGER NOT NULL DEFAULT 0')
+    cursor.connection.commit()
+
+
+def fingerprint_files(cursor, formats, file_paths, workers=None, start=30.0, seconds=15.0, batchsize=200,
+                      libpath=None):
+    """Fingerprint file_paths into the fingerprints table, in parallel.
+
+    One decoder process per worker; files whose size and mtime did not
+    change since their fingerprint are skipped. Rows are written in
+    batches. Yields (file_path, error) per file, error None on success.
+    libpath is the tree file_paths is the scan of: the rows below it of
+    files that were not scanned (deleted, renamed) are removed at the end.
+    """
+    require_numpy()
+    ensure_table(cursor)
+    known = {}
+    for file_path, size, mtime_ns, version in cursor.execute(
+            "SELECT file, size, mtime_ns, version FROM fingerprints").fetchall():
+        # an older version counts as changed
+        known[file_path] = (size, mtime_ns) if version == VERSION else None
+
+    def changed(file_path):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return True
+        return known.get(file_path) != (st.st_size, st.st_mtime_ns)
+
+    scanned = set()
+
+    def scan():
+        for file_path in file_paths:
+            scanned.add(file_path)
+            if changed(file_path):
+                yield file_path
+
+    workers = workers or os.cpu_count() or 1
+    paths = scan()
+    batch = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # a few files per worker in flight, file_paths may be a generator
+        while True:
+            futures = [executor.submit(_fingerprint_file, formats, file_path, start, seconds)
+                       for file_path in itertools.islice(paths, workers * 4)]
+            if not futures:
+                break
+            for future in futures:
+                file_path, row, error = future.result()
+                if row is not None:
+                    batch.append((file_path,) + row)
+                yield file_path, error
+            if len(batch) >= batchsize:
+                cursor.executemany(INSERT, batch)
+                cursor.connection.commit()
+                batch = []
+    cursor.executemany(INSERT, batch)
+    if libpath:
+        prefix = libpath.rstrip(os.sep) + os.sep
+        gone = [(file_path,) for file_path in known if file_path.startswith(prefix) and file_path not in scanned]
+        cursor.executemany("DELETE FROM fingerprints WHERE file = ?", gone)
+        if gone:
+            logger.info(f"Fingerprints of {len(gone)} files no longer below {libpath} removed")
+    cursor.connection.commit()
+
+
+def load_fingerprints(cursor, libpath=None):
+    """Return (files, vectors matrix, bits list) of the stored fingerprints
+    below libpath (all when None), rows of an older VERSION are left out."""
+    require_numpy()
+    ensure_table(cursor)
+    if libpath:
+        prefix = libpath.rstrip(os.sep) + os.sep
+        rows = cursor.execute("SELECT file, vector, bits FROM fingerprints WHERE file >= ? AND file < ? "
+                              "AND version = ? ORDER BY file", (prefix, prefix + '\uffff', VERSION))
+    else:
+        rows = cursor.execute("SELECT file, vector, bits FROM fingerprints WHERE version = ? ORDER BY file",
+                              (VERSION,))
+    files, vectors, bits = [], [], []
+    for file_path, vector, bit_blob in rows:
+        files.append(file_path)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+        bits.append(np.frombuffer(bit_blob, dtype='<u4'))
+    dim = TIME_SLOTS * BANDS
+    return files, np.vstack(vectors) if vectors else np.zeros((0, dim), np.float32), bits
+
+
+# index #
+
+def lsh_parameters(count, similarity=0.85, recall=0.99, bucket=8, max_bits=16):
+    """Return (tables, bits) of a FingerprintIndex over count vectors.
+
+    A random hyperplane keeps two vectors at cosine c on the same side
+    with probability p = 1 - acos(c) / pi, so a pair shares a bucket of
+    one table with p ** bits and of any table with 1 - (1 - p ** bits) **
+    tables. bits is chosen for buckets of about `bucket` vectors, tables
+    for `recall` at `similarity` (0.85: p = 0.82; 50,000 tracks: 13 bits,
+    56 tables).
+    """
+    p = 1 - math.acos(min(max(similarity, -1.0), 1.0)) / math.pi
+    bits = max(1, min(max_bits, math.ceil(math.log2(max(count, 2) / bucket))))
+    share = p ** bits
+    if share >= 1:
+        return 1, bits
+    return max(1, math.ceil(math.log(1 - recall) / math.log(1 - share))), bits
+
+
+class FingerprintIndex(object):
+    """Random hyperplane LSH over the fingerprint vectors.
+
+    Every table hashes a vector to the signs of `bits` random projections;
+    vectors with a small angle between them share a bucket in at least one
+    of the tables. Without explicit tables and bits they are sized by
+    lsh_parameters() so a pair at cosine `similarity` is found with
+    probability `recall`.
+    """
+
+    def __init__(self, vectors, similarity=0.85, recall=0.99, tables=None, bits=None, seed=0):
+        require_numpy()
+        self.vectors = vectors
+        if tables is None or bits is None:
+            tables, bits = lsh_parameters(len(vectors), similarity, recall)
+        self.tables, self.bits = tables, bits
+        self.planes = np.random.default_rng(seed).standard_normal(
+            (vectors.shape[1], tables * bits)).astype(np.float32)
+        # (n, tables) bucket keys
+        self.keys = self.bucket_keys(vectors)
+
+    def bucket_keys(self, vectors, chunk=4096):
+        # in row chunks, the projections of all tables at once are big
+        weights = 1 << np.arange(self.bits, dtype=np.int64)
+        keys = np.empty((len(vectors), self.tables), np.int64)
+        for start in range(0, len(vectors), chunk):
+            signs = vectors[start:start + chunk] @ self.planes > 0
+            keys[start:start + chunk] = signs.reshape(-1, self.tables, self.bits) @ weights
+        return keys
+
+    def buckets(self, max_bucket=200):
+        """Yield the index arrays of every bucket holding 2..max_bucket
+        vectors (bigger buckets are silence and noise)."""
+        for table in range(self.keys.shape[1]):
+            order = np.argsort(self.keys[:, table], kind='stable')
+            boundaries = np.flatnonzero(np.diff(self.keys[order, table])) + 1
+            for bucket in np.split(order, boundaries):
+                if 1 < len(bucket) <= max_bucket:
+                    yield bucket
+
+    def candidate_pairs(self, max_bucket=200):
+        """Return the (i, j) pairs sharing a bucket, i < j, as two arrays."""
+        n = len(self.vectors)
+        pairs = []
+        for bucket in self.buckets(max_bucket):
+            bucket = np.sort(bucket)
+            first, second = np.triu_indices(len(bucket), 1)
+            pairs.append(bucket[first] * n + bucket[second])
+        if not pairs:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        pairs = np.unique(np.concatenate(pairs))
+        return pairs // n, pairs % n
+
+    def query(self, vector, count=10):
+        """Return [(index, cosine)] of the nearest candidates of vector."""
+        keys = self.bucket_keys(vector[None, :])[0]
+        candidates = np.flatnonzero((self.keys == keys).any(axis=1))
+        similarity = self.vectors[candidates] @ vector
+        best = np.argsort(-similarity)[:count]
+        return list(zip(candidates[best].tolist(), similarity[best].tolist()))
+
+
+def find_duplicates(files, vectors, bits, similarity=0.85, max_ber=0.35):
+    """Yield (file_a, file_b, cosine, bit_error_rate, kind) for every pair
+    of tracks that sound the same, kind is 'cross-format' (e.g. FLAC and
+    MP3) or 'same-format' (e.g. an album ripped twice)."""
+    require_numpy()
+    index = FingerprintIndex(vectors, similarity)
+    first, second = index.candidate_pairs()
+    if not len(first):
+        return
+    # the cheap vector check for all candidates at once, bits for the survivors
+    cosines = np.einsum('ij,ij->i', vectors[first], vectors[second])
+    close = cosines >= similarity
+    for i, j, cosine in zip(first[close].tolist(), second[close].tolist(), cosines[close].tolist()):
+        ber = bit_error_rate(bits[i], bits[j])
+        if ber > max_ber:
+            continue
+        same = os.path.splitext(files[i])[1].lower() == os.path.splitext(files[j])[1].lower()
+        yield files[i], files[j], cosine, ber, 'same-format' if same else 'cross-format'
+
+
+if __name__ == '__main__':
+    import argparse
+    import sqlite3
+    import sys
+
+    from appconfig import ConfigError, load_config
+    from library import scan_files
+
+    parser = argparse.ArgumentParser(description='Find tracks that sound the same (FLAC/MP3 copies, re-rips).')
+    parser.add_argument('libpath')
+    parser.add_argument('--db', default='./data/paranoid.db')
+    parser.add_argument('--ini', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      'musiclibmanager.ini'))
+    args = parser.parse_args()
+
+    try:
+        settings = load_config(args.ini)
+    except ConfigError as error:
+        sys.exit(str(error))
+    if np is None:
+        sys.exit("audio fingerprints need NumPy (pip install numpy)")
+    section = settings.fingerprint
+    connection = sqlite3.connect(args.db)
+    cursor = connection.cursor()
+    for file_path, error in fingerprint_files(cursor, settings.formats,
+                                              scan_files(args.libpath, ','.join(settings.library.filetypes)),
+                                              section.workers or None, section.start, section.seconds,
+                                              libpath=args.libpath):
+        if error:
+            print(f"SKIPPED {file_path}: {error}", file=sys.stderr)
+    files, vectors, bits = load_fingerprints(cursor, args.libpath)
+    for file_a, file_b, cosine, ber, kind in find_duplicates(files, vectors, bits, section.similarity,
+                                                               section.maxber):
+        print(f"{kind.upper()} {cosine:.3f} {ber:.3f}\n  {file_a}\n  {file_b}")
+    connection.close()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: hashcache.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Content cache of the checksum engine. A digest is remembered
+#              per (device, inode, size, mtime_ns), so files renamed or
+#              moved within a filesystem, and hard links, are not read
+#              again. With the 'extents' identity, reflinked copies are also
+#              recognized by their shared physical extents.
+#
+#              Scrub never uses the cache: finding bit rot needs the read.
+#
+import hashlib
+import logging
+import os
+
+from iosched import extent_map
+
+logger = logging.getLogger(__name__)
+
+CACHETABLE = (
+    'CREATE TABLE IF NOT EXISTS "content_cache" ("dev" INTEGER NOT NULL, "inode" INTEGER NOT NULL, '
+    '"size" INTEGER NOT NULL, "mtime_ns" INTEGER NOT NULL, "chksumtype" TEXT NOT NULL, '
+    '"chksum" TEXT NOT NULL, PRIMARY KEY("dev", "inode", "chksumtype"))',
+    # extent identity: the file the digest was taken from, checked again on every hit
+    'CREATE TABLE IF NOT EXISTS "content_extents" ("dev" INTEGER NOT NULL, "extents" TEXT NOT NULL, '
+    '"chksumtype" TEXT NOT NULL, "file" TEXT NOT NULL, "inode" INTEGER NOT NULL, '
+    '"mtime_ns" INTEGER NOT NULL, "chksum" TEXT NOT NULL, PRIMARY KEY("dev", "extents", "chksumtype"))',
+)
+IDENTITIES = ('inode', 'extents')
+
+
+def _extents_key(size, extents):
+    return hashlib.sha1(repr((size, extents)).encode()).hexdigest()
+
+
+class ContentCache(object):
+    """Digest cache in paranoid.db, used by checksum.hash_files(cache=...).
+
+    Lookups and updates run in the thread iterating hash_files() (the
+    sqlite connection is not shared with the hash workers). New digests
+    are written in batches; call flush() when done.
+    """
+
+    def __init__(self, connection, checksumtype, identity='inode', batchsize=1000):
+        if identity not in IDENTITIES:
+            raise ValueError(f"identity must be one of {IDENTITIES}")
+        self.cursor = connection.cursor()
+        for sql in CACHETABLE:
+            self.cursor.execute(sql)
+        self.checksumtype = checksumtype
+        self.identity = identity
+        self.batchsize = batchsize
+        self.hits = 0
+        self.misses = 0
+        # stat of every file handed to the engine, checked again before storing
+        self._pending = {}
+        self._rows = []
+        self._extent_rows = []
+
+    def lookup(self, file_path):
+        """Return the cached digest of file_path, or None (the file then
+        has to be hashed and store() called with the result)."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        row = self.cursor.execute(
+            "SELECT chksum FROM content_cache WHERE dev = ? AND inode = ? AND chksumtype = ? "
+            "AND size = ? AND mtime_ns = ?",
+            (st.st_dev, st.st_ino, self.checksumtype, st.st_size, st.st_mtime_ns)).fetchone()
+        if row is None and self.identity == 'extents':
+            row = self._lookup_extents(file_path, st)
+        if row is not None:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        self._pending[file_path] = st
+        return None
+
+    def _lookup_extents(self, file_path, st):
+        extents = extent_map(file_path)
+        if extents is None:
+            return None
+        row = self.cursor.execute(
+            "SELECT file, inode, mtime_ns, chksum FROM content_extents "
+            "WHERE dev = ? AND extents = ? AND chksumtype = ?",
+            (st.st_dev, _extents_key(st.st_size, extents), self.checksumtype)).fetchone()
+        if row is None:
+            return None
+        origin, inode, mtime_ns, chksum = row
+        # the hashed file must be unchanged and still own the same blocks,
+        # then file_path reads the very bytes that were hashed
+        try:
+            origin_st = os.stat(origin)
+        except OSError:
+            return None
+        if (origin_st.st_dev, origin_st.st_ino, origin_st.st_size, origin_st.st_mtime_ns) != \
+                (st.st_dev, inode, st.st_size, mtime_ns) or extent_map(origin) != extents:
+            return None
+        return (chksum,)
+
+    def store(self, file_path, chksum):
+        """Remember the digest of a file returned by the engine, unless the
+        file changed while it was being read."""
+        before = self._pending.pop(file_path, None)
+        if before is None:
+            return
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return
+        if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != \
+                (before.st_dev, before.st_ino, before.st_size, before.st_mtime_ns):
+            return
+        self._rows.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, self.checksumtype, chksum))
+        if self.identity == 'extents':
+            extents = extent_map(file_path)
+            if extents is not None:
+                self._extent_rows.append((st.st_dev, _extents_key(st.st_size, extents), self.checksumtype,
+                                          file_path, st.st_ino, st.st_mtime_ns, chksum))
+        if len(self._rows) >= self.batchsize:
+            self.flush()
+
+    def discard(self, file_path):
+        """Forget the stat of a file the engine could not hash."""
+        self._pending.pop(file_path, None)
+
+    def flush(self):
+        self.cursor.executemany("INSERT OR REPLACE INTO content_cache VALUES (?, ?, ?, ?, ?, ?)", self._rows)
+        self.cursor.executemany("INSERT OR REPLACE INTO content_extents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                self._extent_rows)
+        self.cursor.connection.commit()
+        self._rows, self._extent_rows = [], []
+
+
+def cache_from_config(settings, connection, checksumtype):
+    """Create a ContentCache from the [CACHE] settings (appconfig.CacheSettings),
+    None when disabled."""
+    if not settings.enabled:
+        return None
+    return ContentCache(connection, checksumtype, settings.identity)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: ingest.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Add new music to the library. Files are copied into
+#              [LIBRARY] location and checksummed in the same pass, the
+#              checksum rows are written straight away and the optional
+#              [FLAC]/[MP3] verify commands run in parallel with the copy.
+#
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from convert import format_settings
+from library import scan_albums, format_command
+from sync import copy_verified, commit_copy, discard_copy
+
+logger = logging.getLogger(__name__)
+
+INSERT = "INSERT OR REPLACE INTO checksum (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)"
+
+
+def verify_command(formats, file_path):
+    """Return the [FLAC]/[MP3]/... verify command of file_path, or None."""
+    settings = format_settings(formats, file_path)
+    if settings and settings.verify:
+        return format_command(settings.verify, filename=file_path)
+    return None
+
+
+def run_verify(command):
+    """Run a verify command, returns None when it passed or its error text."""
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as error:
+        return str(error)
+    if result.returncode:
+        return result.stderr.decode('utf-8', 'replace').strip() or f"exit code {result.returncode}"
+    return None
+
+
+def _copy(src, dst, checksumtype):
+    try:
+        chksum = copy_verified(src, dst, checksumtype)
+    except OSError as error:
+        discard_copy(dst)
+        return src, dst, None, str(error)
+    commit_copy(dst)
+    return src, dst, chksum, None
+
+
+def ingest(cursor, source, settings, workers=4, verify=True):
+    """Copy the music below source into the library (settings is the
+    appconfig.Settings).
+
+    The album tree keeps its shape under [LIBRARY] location: ingesting
+    /media/usb/Artist - Album creates <location>/Artist - Album. Existing
+    files are never overwritten. Yields (file, status, error) with status
+    'ingested', 'exists', 'verify-failed', 'unchecked' (copied and
+    checksummed, the verify command is not installed) or 'error'.
+    """
+    library = settings.library.location
+    checksumtype = settings.library.checksumtype
+    base = os.path.dirname(os.path.abspath(source).rstrip(os.sep))
+
+    copies = ThreadPoolExecutor(max_workers=workers)
+    checks = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = []
+        for album_dir, file_paths in scan_albums(source, settings.library.match):
+            for src in file_paths:
+                dst = os.path.join(library, os.path.relpath(src, base))
+                if os.path.exists(dst):
+                    yield dst, 'exists', None
+                    continue
+                pending.append(copies.submit(_copy, src, dst, checksumtype))
+
+        verifying = []
+        for future in pending:
+            src, dst, chksum, error = future.result()
+            if error:
+                yield dst, 'error', error
+                continue
+            cursor.execute(INSERT, (library, dst, checksumtype, chksum))
+            cursor.connection.commit()
+            command = verify_command(settings.formats, dst) if verify else None
+            if command is None:
+                yield dst, 'ingested', None
+            elif shutil.which(command[0]) is None:
+                # a missing verifier says nothing about the file
+                yield dst, 'unchecked', f"{command[0]} not found"
+            else:
+                # decoding runs next to the copies, the file is still in the page cache
+                verifying.append((dst, checks.submit(run_verify, command)))
+
+        for dst, future in verifying:
+            error = future.result()
+            yield dst, 'verify-failed' if error else 'ingested', error
+    finally:
+        copies.shutdown(cancel_futures=True)
+        checks.shutdown(cancel_futures=True)
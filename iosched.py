@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: iosched.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: I/O scheduler for the checksum engine. On spinning disks the
+#              files are hashed in physical (FIEMAP) or inode order with a
+#              cap on concurrent reads per device, so the heads stream
+#              instead of seeking between albums.
+#
+import fcntl
+import os
+import struct
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+# linux/fs.h: _IOWR('f', 11, struct fiemap)
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_FLAG_SYNC = 0x00000001
+# struct fiemap header (32 bytes) followed by struct fiemap_extent (56 bytes)
+FIEMAP_HEADER = struct.Struct('=QQLLLL')
+FIEMAP_EXTENT = struct.Struct('=QQQQQLLLL')
+FIEMAP_EXTENT_LAST = 0x00000001
+# extents whose location is not final or not a plain block range
+FIEMAP_EXTENT_UNSTABLE = 0x00000002 | 0x00000004 | 0x00000200 | 0x00000400  # UNKNOWN, DELALLOC, INLINE, TAIL
+
+# order: 'physical' sorts on the first extent (inode when FIEMAP is not
+# supported), 'scan' keeps the os.walk order
+Profile = namedtuple('Profile', 'name inflight blocksize order')
+PROFILES = {
+    'hdd': Profile('hdd', 1, 4 * MB, 'physical'),
+    'ssd': Profile('ssd', 8, 1 * MB, 'scan'),
+}
+
+
+def physical_offset(file_path):
+    """Return the physical byte offset of the first extent of file_path,
+    or None when the filesystem does not support FIEMAP."""
+    request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+    FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, FIEMAP_FLAG_SYNC, 0, 1, 0)
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    mapped = FIEMAP_HEADER.unpack_from(request, 0)[3]
+    if not mapped:
+        return None
+    return FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size)[1]
+
+
+def extent_map(file_path, max_extents=64):
+    """Return the extents of file_path as ((logical, physical, length), ...),
+    or None when FIEMAP is not supported, an extent is not settled on disk
+    (delayed allocation, inline data) or the file has more than
+    max_extents extents. Reflinked copies share the same physical extents.
+    """
+    request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size * max_extents)
+    FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, FIEMAP_FLAG_SYNC, 0, max_extents, 0)
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    mapped = FIEMAP_HEADER.unpack_from(request, 0)[3]
+    extents = []
+    for i in range(mapped):
+        extent = FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size + i * FIEMAP_EXTENT.size)
+        if extent[5] & FIEMAP_EXTENT_UNSTABLE:
+            return None
+        extents.append(extent[:3])
+        if extent[5] & FIEMAP_EXTENT_LAST:
+            return tuple(extents)
+    # no extents (empty file) or more than max_extents
+    return None
+
+
+def is_rotational(device):
+    """True for spinning disks, None when sysfs does not tell."""
+    path = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    try:
+        path = os.path.realpath(path)
+        # a partition has no queue/ of its own, its parent disk does
+        if os.path.exists(os.path.join(path, 'partition')):
+            path = os.path.dirname(path)
+        with open(os.path.join(path, 'queue', 'rotational')) as f:
+            return f.read().strip() == '1'
+    except OSError:
+        return None
+
+
+class IOScheduler(object):
+    """Orders the work queue and limits concurrent reads per device.
+
+    profile is 'hdd', 'ssd' or 'auto' (sysfs rotational flag per device,
+    unknown devices get the ssd profile). Files are ordered inside windows
+    of `window` files, devices are interleaved so every disk stays busy.
+    """
+
+    def __init__(self, profile='auto', window=10000, inflight=None):
+        self.profile_name = profile
+        self.window = window
+        self.inflight = inflight or {}
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._slots = {}
+        self._devices = {}
+
+    def profile(self, device):
+        with self._lock:
+            if device not in self._profiles:
+                name = self.profile_name
+                if name == 'auto':
+                    name = 'hdd' if is_rotational(device) else 'ssd'
+                profile = PROFILES[name]
+                if name in self.inflight:
+                    profile = profile._replace(inflight=self.inflight[name])
+                self._profiles[device] = profile
+                self._slots[device] = threading.BoundedSemaphore(profile.inflight)
+            return self._profiles[device]
+
+    def _key(self, file_path, st):
+        offset = physical_offset(file_path)
+        return st.st_ino if offset is None else offset
+
+    def _flush(self, batch):
+        by_device = {}
+        for file_path, st in batch:
+            by_device.setdefault(st.st_dev, []).append((file_path, st))
+        queues = []
+        for device, files in by_device.items():
+            if self.profile(device).order == 'physical':
+                files.sort(key=lambda item: self._key(*item))
+            queues.append(iter(files))
+        # round robin over the devices
+        while queues:
+            for queue in list(queues):
+                item = next(queue, None)
+                if item is None:
+                    queues.remove(queue)
+                    continue
+                with self._lock:
+                    self._devices[item[0]] = item[1].st_dev
+                yield item[0]
+
+    def order(self, file_paths):
+        """Yield file_paths in scheduled order."""
+        batch = []
+        for file_path in file_paths:
+            try:
+                batch.append((file_path, os.stat(file_path)))
+            except OSError:
+                # let the engine report the error
+                yield file_path
+                continue
+            if len(batch) >= self.window:
+                yield from self._flush(batch)
+                batch = []
+        yield from self._flush(batch)
+
+    def forget(self, file_path):
+        """Drop a file yielded by order() that will not be read (a cache hit)."""
+        with self._lock:
+            self._devices.pop(file_path, None)
+
+    @contextmanager
+    def slot(self, file_path):
+        """Hold one of the read slots of the device of file_path, yields its Profile."""
+        with self._lock:
+            device = self._devices.pop(file_path, None)
+        if device is None:
+            device = os.stat(file_path).st_dev
+        profile = self.profile(device)
+        with self._slots[device]:
+            yield profile
+
+
+def scheduler_from_config(settings):
+    """Create an IOScheduler from the [IOSCHED] settings (appconfig.IoschedSettings),
+    None when disabled."""
+    if settings.profile == 'off':
+        return None
+    return IOScheduler(settings.profile, settings.window,
+                       {'hdd': settings.hddinflight, 'ssd': settings.ssdinflight})
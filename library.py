@@ -7,6 +7,8 @@
 #
 import os
 import fnmatch
+import re
+import shlex
 
 class Library(object):
     condition = 'New'
@@ -27,4 +29,41 @@ class Library(object):
     # Library -> Images inside, outside or mixed?
     # How to check SACD DSF files?
     # do people mix different file formats in the same directory?
-    
\ No newline at end of file
+    
+
+def filetype_matcher(filetypes):
+    """Compile a comma delimited pattern list of the ini file
+    ("*.flac,*.dsf,*.mp3" or "cover.jpg, folder.jpg") into one regular
+    expression, returns its match function (a file name matching several
+    patterns is matched once).
+    """
+    patterns = [fnmatch.translate(p.strip()) for p in filetypes.split(',') if p.strip()]
+    return re.compile('|'.join(patterns) or '(?!)').match
+
+
+def scan_albums(libpath, filetypes):
+    """Yield (directory, file_paths) for every directory below libpath
+    holding files matching filetypes.
+
+    filetypes is the comma delimited pattern list of the ini file, or a
+    matcher made by filetype_matcher().
+    """
+    match = filetype_matcher(filetypes) if isinstance(filetypes, str) else filetypes
+    for root, dirnames, filenames in os.walk(libpath):
+        file_paths = [os.path.join(root, filename) for filename in filenames if match(filename)]
+        if file_paths:
+            yield root, file_paths
+
+
+def scan_files(libpath, filetypes):
+    """Yield the path of every file below libpath matching filetypes."""
+    for root, file_paths in scan_albums(libpath, filetypes):
+        yield from file_paths
+
+
+def format_command(template, **fields):
+    """Turn an ini command template ("/usr/bin/flac -t {filename}") into an
+    argument list. Placeholders are substituted per argument after the
+    split, so file names with spaces or quotes need no escaping.
+    """
+    return [arg.format(**fields) for arg in shlex.split(template)]
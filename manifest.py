@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: manifest.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Read and write checksum manifests (sha256sum, md5sum, b2sum,
+#              BSD tagged and FLAC .ffp files) and verify against them.
+#
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+from checksum import hash_files, get_file_hash
+from library import scan_albums
+
+# manifest extension -> checksum type stored in the checksum table
+EXTENSIONS = {
+    '.sha256': 'sha256',
+    '.sha1': 'sha1',
+    '.sha512': 'sha512',
+    '.md5': 'md5',
+    '.b2': 'blake2b',
+    '.blake2': 'blake2b',
+    '.ffp': 'ffp',
+}
+# BSD tag (sha256sum --tag, b2sum --tag) -> checksum type
+TAGS = {
+    'SHA256': 'sha256',
+    'SHA224': 'sha224',
+    'SHA384': 'sha384',
+    'SHA512': 'sha512',
+    'SHA1': 'sha1',
+    'MD5': 'md5',
+    'BLAKE2b': 'blake2b',
+    'BLAKE2s': 'blake2s',
+}
+# digest length in hex chars, used when the extension gives no hint
+LENGTHS = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+
+TAGGED_LINE = re.compile(r'^(\\?)([A-Za-z0-9_-]+) \((.*)\) = ([0-9a-fA-F]+)$')
+PLAIN_LINE = re.compile(r'^(\\?)([0-9a-fA-F]+) [ *](.*)$')
+FFP_LINE = re.compile(r'^(.*):([0-9a-fA-F]{32})$')
+
+DEFAULT_BATCHSIZE = 10000
+
+# album manifest: a header line and one "chksum<TAB>size<TAB>mtime_ns<TAB>name"
+# line per file, kept next to the music so no paranoid.db is needed
+ALBUM_MANIFEST = '.musiclibmanager.manifest'
+ALBUM_HEADER = '# musiclibmanager manifest 1 '
+
+
+def _unescape(name):
+    # GNU coreutils escapes '\' and newlines and flags the line with '\'
+    return name.replace('\\\\', '\0').replace('\\n', '\n').replace('\0', '\\')
+
+
+def _escape(name):
+    if '\\' in name or '\n' in name:
+        return '\\', name.replace('\\', '\\\\').replace('\n', '\\n')
+    return '', name
+
+
+def manifest_type(manifest_path):
+    return EXTENSIONS.get(os.path.splitext(manifest_path)[1].lower())
+
+
+def read_manifest(manifest_path):
+    """Stream the entries of a manifest file.
+
+    Yields (relative_path, chksumtype, chksum) tuples, one line at a time.
+    Comment lines (';' or '#') and lines that can not be parsed are skipped.
+    """
+    default_type = manifest_type(manifest_path)
+    with open(manifest_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line or line[0] in ';#':
+                continue
+            if default_type == 'ffp':
+                match = FFP_LINE.match(line)
+                if match:
+                    yield match.group(1), 'ffp', match.group(2).lower()
+                continue
+            match = TAGGED_LINE.match(line)
+            if match and match.group(2) in TAGS:
+                name = match.group(3)
+                if match.group(1):
+                    name = _unescape(name)
+                yield name, TAGS[match.group(2)], match.group(4).lower()
+                continue
+            match = PLAIN_LINE.match(line)
+            if match:
+                name = match.group(3)
+                if match.group(1):
+                    name = _unescape(name)
+                chksum = match.group(2).lower()
+                yield name, default_type or LENGTHS.get(len(chksum), 'sha256'), chksum
+
+
+def find_manifests(libpath):
+    """Yield every manifest file found below libpath."""
+    for root, dirnames, filenames in os.walk(libpath):
+        for filename in filenames:
+            if manifest_type(filename):
+                yield os.path.join(root, filename)
+
+
+def import_manifest(cursor, manifest_path, libpath=None, batchsize=DEFAULT_BATCHSIZE):
+    """Load a manifest into the checksum table, committing every batchsize rows.
+
+    Paths in the manifest are relative to the directory holding it. libpath
+    is stored with every row, it defaults to that directory. Returns the
+    number of rows imported.
+    """
+    basedir = os.path.dirname(os.path.abspath(manifest_path))
+    libpath = libpath or basedir
+    sql = "INSERT OR REPLACE INTO checksum (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)"
+    count = 0
+    batch = []
+    for name, chksumtype, chksum in read_manifest(manifest_path):
+        batch.append((libpath, os.path.normpath(os.path.join(basedir, name)), chksumtype, chksum))
+        if len(batch) >= batchsize:
+            cursor.executemany(sql, batch)
+            cursor.connection.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        cursor.connection.commit()
+        count += len(batch)
+    return count
+
+
+def import_manifests(cursor, libpath, batchsize=DEFAULT_BATCHSIZE):
+    """Import every manifest left by rippers below libpath."""
+    count = 0
+    for manifest_path in find_manifests(libpath):
+        count += import_manifest(cursor, manifest_path, libpath, batchsize)
+    return count
+
+
+def _write_line(f, name, chksumtype, chksum, style):
+    flag, name = _escape(name)
+    if style == 'bsd':
+        tag = next((t for t, c in TAGS.items() if c == chksumtype), chksumtype.upper())
+        f.write(f"{flag}{tag} ({name}) = {chksum}\n")
+    else:
+        f.write(f"{flag}{chksum}  {name}\n")
+
+
+def export_manifest(cursor, manifest_path, libpath, style='gnu'):
+    """Write all checksums of libpath into a single manifest file.
+
+    style is 'gnu' (sha256sum/b2sum output) or 'bsd' (--tag output). Rows
+    are streamed from the database, paths are written relative to the
+    manifest directory. Returns the number of lines written.
+    """
+    basedir = os.path.dirname(os.path.abspath(manifest_path))
+    count = 0
+    rows = cursor.execute("SELECT file, chksumtype, chksum FROM checksum WHERE libpath = ? "
+                          "AND chksumtype <> 'ffp' ORDER BY file", (libpath,))
+    with open(manifest_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+        for file, chksumtype, chksum in rows:
+            _write_line(f, os.path.relpath(file, basedir), chksumtype, chksum, style)
+            count += 1
+    return count
+
+
+def export_album_manifests(cursor, libpath, name='checksums', style='gnu'):
+    """Write one manifest per album directory of libpath.
+
+    The manifest is named <name><ext>, ext depends on the checksum type
+    (.sha256, .md5, .b2 ...), an album holding several checksum types gets
+    one manifest per type. Returns the number of manifests written.
+    """
+    extensions = {c: e for e, c in reversed(list(EXTENSIONS.items()))}
+    # rtrim(file, replace(file, '/', '')) strips the file name and keeps the
+    # directory, so every album (and checksum type) is one contiguous group
+    rows = cursor.execute("SELECT rtrim(file, replace(file, '/', '')) AS dir, file, chksumtype, chksum "
+                          "FROM checksum WHERE libpath = ? AND chksumtype <> 'ffp' "
+                          "ORDER BY dir, chksumtype, file", (libpath,))
+    count = 0
+    current, f = None, None
+    try:
+        for directory, file, chksumtype, chksum in rows:
+            if (directory, chksumtype) != current:
+                if f:
+                    f.close()
+                current = (directory, chksumtype)
+                f = open(os.path.join(directory, name + extensions.get(chksumtype, '.' + chksumtype)),
+                         'w', encoding='utf-8', errors='surrogateescape')
+                count += 1
+            _write_line(f, os.path.basename(file), chksumtype, chksum, style)
+    finally:
+        if f:
+            f.close()
+    return count
+
+
+def read_flac_md5(file_path):
+    """Return the audio MD5 stored in the FLAC STREAMINFO block (as .ffp uses)."""
+    with open(file_path, 'rb') as f:
+        header = f.read(4 + 4 + 34)
+    if header[:4] != b'fLaC' or len(header) < 42 or header[4] & 0x7f != 0:
+        raise OSError(f"Not a FLAC file: {file_path}")
+    return header[8 + 18:8 + 34].hex()
+
+
+def verify_checksums(cursor, libpath, destpath=None, workers=None, formats=None):
+    """Verify the stored checksums of libpath against the files on disk.
+
+    When destpath is given every file is looked up relative to destpath
+    instead of libpath, so a copy can be verified against the manifests of
+    its source without hashing the source again. Files are hashed with the
+    parallel checksum engine. Yields (file, status, expected, actual) with
+    status one of 'ok', 'mismatch', 'missing', 'error' or 'unchecked'.
+
+    .ffp rows hold the audio MD5 of STREAMINFO, which says nothing about
+    the frames on disk: a matching file is decoded with the [FLAC] verify
+    command of formats (appconfig Settings.formats), flac -t checks the
+    decoded audio against that MD5. Without the command it is 'unchecked'.
+    """
+    destpath = destpath or libpath
+    types = [row[0] for row in cursor.execute(
+        "SELECT DISTINCT chksumtype FROM checksum WHERE libpath = ?", (libpath,))]
+    for chksumtype in types:
+        expected = {}
+
+        def targets():
+            rows = cursor.connection.execute(
+                "SELECT file, chksum FROM checksum WHERE libpath = ? AND chksumtype = ?",
+                (libpath, chksumtype))
+            for file, chksum in rows:
+                target = os.path.join(destpath, os.path.relpath(file, libpath))
+                expected[target] = chksum
+                yield target
+
+        if chksumtype == 'ffp':
+            yield from _verify_ffp(targets(), expected, formats or {}, workers)
+            continue
+
+        for target, actual, error in hash_files(targets(), chksumtype, workers):
+            chksum = expected.pop(target)
+            if isinstance(error, FileNotFoundError):
+                yield target, 'missing', chksum, None
+            elif error:
+                yield target, 'error', chksum, None
+            else:
+                yield target, 'ok' if actual == chksum else 'mismatch', chksum, actual
+
+
+def _verify_ffp(targets, expected, formats, workers=None):
+    # circular at import time: ingest -> sync -> paranoid -> manifest
+    from ingest import run_verify, verify_command
+
+    workers = workers or os.cpu_count() or 1
+    pending = {}
+    targets = iter(targets)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        exhausted = False
+        while True:
+            # a few decodes per worker in flight, results as they complete
+            while not exhausted and len(pending) < workers * 4:
+                target = next(targets, None)
+                if target is None:
+                    exhausted = True
+                    break
+                chksum = expected.pop(target)
+                try:
+                    actual = read_flac_md5(target)
+                except FileNotFoundError:
+                    yield target, 'missing', chksum, None
+                    continue
+                except OSError:
+                    yield target, 'error', chksum, None
+                    continue
+                if actual != chksum:
+                    yield target, 'mismatch', chksum, actual
+                    continue
+                command = verify_command(formats, target)
+                if command is None or shutil.which(command[0]) is None:
+                    yield target, 'unchecked', chksum, actual
+                    continue
+                pending[executor.submit(run_verify, command)] = (target, chksum, actual)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                target, chksum, actual = pending.pop(future)
+                yield target, 'mismatch' if future.result() else 'ok', chksum, actual
+
+
+def write_album_manifest(album_dir, entries, checksumtype, name=ALBUM_MANIFEST):
+    """Write the album manifest of album_dir.
+
+    entries is a list of (filename, chksum, size, mtime_ns) tuples. The file
+    is written under a temporary name and renamed, so an interrupted run
+    never leaves half a manifest behind.
+    """
+    manifest_path = os.path.join(album_dir, name)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8', errors='surrogateescape') as f:
+        f.write(ALBUM_HEADER + checksumtype + '\n')
+        for filename, chksum, size, mtime_ns in sorted(entries):
+            flag, filename = _escape(filename)
+            f.write(f"{flag}{chksum}\t{size}\t{mtime_ns}\t{filename}\n")
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest_path
+
+
+def read_album_manifest(manifest_path):
+    """Return (chksumtype, entries) of an album manifest.
+
+    entries is a list of (filename, chksum, size, mtime_ns) tuples.
+    """
+    entries = []
+    with open(manifest_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        header = f.readline().rstrip('\r\n')
+        if not header.startswith(ALBUM_HEADER):
+            raise ValueError(f"Not an album manifest: {manifest_path}")
+        chksumtype = header[len(ALBUM_HEADER):]
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            flag = line.startswith('\\')
+            chksum, size, mtime_ns, filename = line[flag:].split('\t', 3)
+            if flag:
+                filename = _unescape(filename)
+            entries.append((filename, chksum, int(size), int(mtime_ns)))
+    return chksumtype, entries
+
+
+def write_album_manifests(libpath, filetypes, checksumtype='sha256', workers=None,
+                          name=ALBUM_MANIFEST):
+    """Hash every music file of libpath and write one manifest per album.
+
+    All files go through one parallel hash pool, an album manifest is
+    written as soon as the last file of that album is hashed. Yields
+    (manifest_path, file_count, errors) per album.
+    """
+    albums = {}
+    # album of every file in the pool, as scan_albums() named it (the
+    # dirname of a top level file lacks the trailing slash of libpath)
+    owners = {}
+
+    def files():
+        for album_dir, file_paths in scan_albums(libpath, filetypes):
+            # register the whole album before its first file reaches the pool
+            albums[album_dir] = {'pending': len(file_paths), 'entries': [], 'errors': 0}
+            for file_path in file_paths:
+                owners[file_path] = album_dir
+                yield file_path
+
+    for file_path, chksum, error in hash_files(files(), checksumtype, workers):
+        album_dir = owners.pop(file_path)
+        album = albums[album_dir]
+        album['pending'] -= 1
+        st = None
+        if not error:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                # removed since it was hashed, counted like a hash failure
+                pass
+        if st is None:
+            album['errors'] += 1
+        else:
+            album['entries'].append((os.path.basename(file_path), chksum, st.st_size, st.st_mtime_ns))
+        if album['pending'] == 0:
+            del albums[album_dir]
+            manifest_path = write_album_manifest(album_dir, album['entries'], checksumtype, name)
+            yield manifest_path, len(album['entries']), album['errors']
+
+
+def verify_album(manifest_path):
+    """Verify one album against its own manifest.
+
+    Returns a list of (file, status) with status one of 'ok', 'mismatch',
+    'missing' or 'error'. A size change is reported as 'mismatch' without
+    reading the file.
+    """
+    album_dir = os.path.dirname(manifest_path)
+    chksumtype, entries = read_album_manifest(manifest_path)
+    results = []
+    for filename, chksum, size, mtime_ns in entries:
+        file_path = os.path.join(album_dir, filename)
+        try:
+            if os.stat(file_path).st_size != size:
+                results.append((file_path, 'mismatch'))
+                continue
+            actual = get_file_hash(file_path, chksumtype)
+        except FileNotFoundError:
+            results.append((file_path, 'missing'))
+            continue
+        except OSError:
+            results.append((file_path, 'error'))
+            continue
+        results.append((file_path, 'ok' if actual == chksum else 'mismatch'))
+    return results
+
+
+def verify_album_manifests(libpath, workers_per_device=2, name=ALBUM_MANIFEST):
+    """Verify a directory tree against its album manifests, no database needed.
+
+    Albums are grouped by device (st_dev) and every device gets its own
+    pool of workers_per_device threads, so throughput grows with the number
+    of disks. Yields (manifest_path, results) as albums complete.
+    """
+    executors = {}
+    futures = {}
+    try:
+        for root, dirnames, filenames in os.walk(libpath):
+            if name not in filenames:
+                continue
+            manifest_path = os.path.join(root, name)
+            device = os.stat(manifest_path).st_dev
+            if device not in executors:
+                executors[device] = ThreadPoolExecutor(max_workers=workers_per_device)
+            futures[executors[device].submit(verify_album, manifest_path)] = manifest_path
+        for future in as_completed(futures):
+            manifest_path = futures[future]
+            try:
+                yield manifest_path, future.result()
+            except (OSError, ValueError):
+                yield manifest_path, [(manifest_path, 'error')]
+    finally:
+        for executor in executors.values():
+            executor.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    # backup disks are often checked on a machine without the GUI:
+    #   python3 manifest.py write /mnt/backup/Music
+    #   python3 manifest.py verify /mnt/backup/Music
+    import argparse
+    import sys
+
+    from appconfig import ConfigError, load_config
+
+    parser = argparse.ArgumentParser(description='Album manifests stored alongside the music.')
+    parser.add_argument('mode', choices=['write', 'verify'])
+    parser.add_argument('libpath')
+    parser.add_argument('--ini', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      'musiclibmanager.ini'))
+    args = parser.parse_args()
+
+    try:
+        settings = load_config(args.ini)
+    except ConfigError as error:
+        sys.exit(str(error))
+    failed = 0
+    if args.mode == 'write':
+        for manifest_path, count, errors in write_album_manifests(args.libpath, settings.library.match,
+                                                                  settings.library.checksumtype):
+            failed += errors
+            print(f"{manifest_path}: {count} files, {errors} errors")
+    else:
+        for manifest_path, results in verify_album_manifests(
+                args.libpath, settings.manifest.workersperdevice):
+            for file_path, status in results:
+                if status != 'ok':
+                    failed += 1
+                    print(f"{status.upper()}: {file_path}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: merkle.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Chunk level hash trees. Every file is split in chunks (4 MiB
+#              by default), the chunk digests are the leaves of a Merkle
+#              tree. Comparing leaves names the damaged byte ranges, so only
+#              those have to be re-read or resynced from a backup.
+#
+import os
+
+from checksum import new_hash, raw_digest, hex_digest
+
+CHUNKSIZE = 4 * 1024 * 1024
+# leaves are stored concatenated in one BLOB, 32 bytes per 4 MiB for sha256
+CHUNKTABLE = ('CREATE TABLE IF NOT EXISTS "chunks" ("file" TEXT NOT NULL, "chksumtype" TEXT NOT NULL, '
+              '"chunksize" INTEGER NOT NULL, "root" TEXT NOT NULL, "leaves" BLOB NOT NULL, '
+              'PRIMARY KEY("file"))')
+
+
+def merkle_root(leaves, checksumtype='sha256'):
+    """Return the hex root of the binary tree over leaves (raw digests).
+
+    Pairs are hashed level by level, an odd node is carried up unchanged.
+    """
+    if not leaves:
+        return hex_digest(new_hash(checksumtype))
+    level = list(leaves)
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level) - 1, 2):
+            node = new_hash(checksumtype)
+            node.update(level[i])
+            node.update(level[i + 1])
+            parents.append(raw_digest(node))
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0].hex()
+
+
+def store_tree(cursor, file_path, checksumtype, chunksize, leaves):
+    cursor.execute("INSERT OR REPLACE INTO chunks (file,chksumtype,chunksize,root,leaves) VALUES (?, ?, ?, ?, ?)",
+                   (file_path, checksumtype, chunksize, merkle_root(leaves, checksumtype), b''.join(leaves)))
+
+
+def load_tree(cursor, file_path):
+    """Return (chksumtype, chunksize, root, leaves) of file_path, or None."""
+    row = cursor.execute("SELECT chksumtype, chunksize, root, leaves FROM chunks WHERE file = ?",
+                         (file_path,)).fetchone()
+    if row is None:
+        return None
+    chksumtype, chunksize, root, blob = row
+    size = len(raw_digest(new_hash(chksumtype)))
+    return chksumtype, chunksize, root, [blob[i:i + size] for i in range(0, len(blob), size)]
+
+
+def _merge(chunks, chunksize, file_size=None):
+    # contiguous bad chunk numbers -> (start, end) byte ranges
+    ranges = []
+    for chunk in chunks:
+        start, end = chunk * chunksize, (chunk + 1) * chunksize
+        if file_size is not None:
+            end = min(end, file_size)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def damaged_ranges(good_leaves, bad_leaves, chunksize, file_size=None):
+    """Byte ranges where bad_leaves differ from good_leaves.
+
+    A file that grew or shrank gets the tail reported as damaged.
+    """
+    count = max(len(good_leaves), len(bad_leaves))
+    chunks = [i for i in range(count)
+              if i >= len(good_leaves) or i >= len(bad_leaves) or good_leaves[i] != bad_leaves[i]]
+    return _merge(chunks, chunksize, file_size)
+
+
+def compare_trees(cursor, source, destination):
+    """For every mismatch in the comparison table (paranoid.store_comparison()
+    of source against destination), yield (relative_path, ranges) with the
+    damaged byte ranges of the destination.
+
+    ranges is None when one side has no chunk tree (hashed without it).
+    """
+    mismatched = [row[0] for row in cursor.execute("SELECT rel FROM comparison WHERE status = 'mismatch' "
+                                                   "ORDER BY rel").fetchall()]
+    for rel in mismatched:
+        good = load_tree(cursor, os.path.join(source, rel))
+        bad = load_tree(cursor, os.path.join(destination, rel))
+        if good is None or bad is None or good[:2] != bad[:2]:
+            yield rel, None
+            continue
+        yield rel, damaged_ranges(good[3], bad[3], good[1])
+
+
+def verify_tree(file_path, checksumtype, chunksize, leaves, stop_at_first=True):
+    """Re-read file_path chunk by chunk against the stored leaves.
+
+    Returns the damaged byte ranges, an empty list when the file is good.
+    With stop_at_first the read stops at the first bad chunk. A truncated
+    file always gets everything from its end to the end of the tree.
+    """
+    bad = []
+    chunk = 0
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        while True:
+            data = f.read(chunksize)
+            if not data:
+                break
+            digest = new_hash(checksumtype)
+            digest.update(data)
+            if chunk >= len(leaves) or raw_digest(digest) != leaves[chunk]:
+                bad.append(chunk)
+                if stop_at_first:
+                    break
+            chunk += 1
+    truncated = -(-file_size // chunksize) < len(leaves)
+    if truncated:
+        # the chunk holding the new end and all the chunks after it
+        bad = sorted(set(bad).union(range(file_size // chunksize, len(leaves))))
+    return _merge(bad, chunksize, None if truncated else file_size)
+
+
+def describe_ranges(ranges):
+    """'0-4194304, 12582912-13000000' for the log."""
+    return ', '.join(f"{start}-{end}" for start, end in ranges)
+
+
+def resync_chunks(good_path, bad_path, ranges):
+    """Copy only the damaged ranges from good_path (the backup) into bad_path.
+
+    Returns the number of bytes written.
+    """
+    written = 0
+    good_size = os.path.getsize(good_path)
+    fd_in = os.open(good_path, os.O_RDONLY)
+    try:
+        fd_out = os.open(bad_path, os.O_WRONLY)
+        try:
+            for start, end in ranges:
+                end = min(end, good_size)
+                while start < end:
+                    data = os.pread(fd_in, min(end - start, CHUNKSIZE), start)
+                    if not data:
+                        break
+                    written += os.pwrite(fd_out, data, start)
+                    start += len(data)
+            os.ftruncate(fd_out, good_size)
+            os.fsync(fd_out)
+        finally:
+            os.close(fd_out)
+    finally:
+        os.close(fd_in)
+    return written
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: metrics.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Counters and stage timers for long running jobs, with a
+#              periodic log summary and an optional Prometheus text / JSON
+#              file (node_exporter textfile collector compatible).
+#
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics(object):
+    """Thread safe counters, stage timers and per device read throughput.
+
+    Stages used by the checksum engine: 'read' (waiting on the disk),
+    'hash' (CPU), 'queue_wait' (file waiting for a free worker) and
+    'result_wait' (caller waiting for results). Callers add their own,
+    e.g. 'scan' and 'db'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.timers = {}
+        self.devices = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def device_read(self, device, nbytes, seconds):
+        with self._lock:
+            total = self.devices.setdefault(device, [0, 0.0])
+            total[0] += nbytes
+            total[1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            return {
+                'elapsed': round(elapsed, 3),
+                'counters': dict(self.counters),
+                'timers': {k: round(v, 6) for k, v in self.timers.items()},
+                'devices': {
+                    f"{os.major(dev)}:{os.minor(dev)}": {
+                        'bytes': nbytes,
+                        'read_seconds': round(seconds, 6),
+                        'mb_per_s': round(nbytes / 1048576 / seconds, 2) if seconds else None,
+                    } for dev, (nbytes, seconds) in self.devices.items()
+                },
+            }
+
+    def summary(self):
+        """One log line: throughput plus where the time went."""
+        snap = self.snapshot()
+        elapsed = snap['elapsed'] or 1
+        files = snap['counters'].get('files', 0)
+        mb = snap['counters'].get('bytes_read', 0) / 1048576
+        timers = ' '.join(f"{k}={v:.1f}s" for k, v in sorted(snap['timers'].items()))
+        devices = ' '.join(f"{d}={v['mb_per_s']}MB/s" for d, v in sorted(snap['devices'].items()))
+        return (f"{files} files ({files / elapsed:.1f}/s) {mb:.1f} MB ({mb / elapsed:.1f} MB/s) "
+                f"errors={snap['counters'].get('errors', 0)} {timers} {devices}").rstrip()
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = [f"musiclib_elapsed_seconds {snap['elapsed']}"]
+        for name, value in sorted(snap['counters'].items()):
+            lines.append(f"musiclib_{name}_total {value}")
+        for name, value in sorted(snap['timers'].items()):
+            lines.append(f'musiclib_stage_seconds_total{{stage="{name}"}} {value}')
+        for device, value in sorted(snap['devices'].items()):
+            lines.append(f'musiclib_device_read_bytes_total{{device="{device}"}} {value["bytes"]}')
+            lines.append(f'musiclib_device_read_seconds_total{{device="{device}"}} {value["read_seconds"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_path, fmt='prometheus'):
+        # written under a temporary name and renamed so readers never see
+        # half a file
+        content = self.to_prometheus() if fmt == 'prometheus' else json.dumps(self.snapshot(), indent=2)
+        with open(file_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(file_path + '.tmp', file_path)
+
+
+class Reporter(threading.Thread):
+    """Log a metrics summary (and refresh the metrics file) every interval seconds."""
+
+    def __init__(self, metrics, interval=30, file_path=None, fmt='prometheus', name='job'):
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        self.file_path = file_path
+        self.fmt = fmt
+        self.job = name
+        self._stop_event = threading.Event()
+
+    def report(self):
+        logger.info(f"{self.job}: {self.metrics.summary()}")
+        if self.file_path:
+            try:
+                self.metrics.write(self.file_path, self.fmt)
+            except OSError as error:
+                logger.error(f"Metrics file {self.file_path}: {error}")
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        """Stop the reporter and write the final summary."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.report()
+
+
+def start_reporter(settings, metrics, name='job'):
+    """Create and start a Reporter from the [METRICS] settings (appconfig.MetricsSettings)."""
+    reporter = Reporter(metrics, settings.interval, settings.file, settings.format, name)
+    reporter.start()
+    return reporter
@@ -1,4 +1,4 @@
-`   ``          qw#!/usr/bin/env python3
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
 # Filename: musiclibmanager.py
@@ -12,27 +12,174 @@
 from tkinter import *
 from tkinter import ttk
 from tkinter import filedialog
-# ini file reader
-import configparser
-import subprocess
+from tkinter import messagebox
+import time
+STARTED = time.perf_counter()
 # create log files
 import logging
-# support for SQLite3 database
-import sqlite3
-import fnmatch, os, hashlib
-# Classes for eacj menu item
-from Toplevel_paranoid import Toplevel_paranoid
-
-def get_sha256_hash(file_path):
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
-    return hash_sha256.hexdigest()
+import os
+import sys
+from applog import setup_logging
+# validated, cached musiclibmanager.ini
+from appconfig import ConfigError, load_config
+# The subsystems (sqlite3, hashlib, the checksum engine and the windows of
+# each menu item) are imported by the menu functions on first use, so the
+# main window shows up without paying for them.
 
 # fileNewItem
+# copy new albums into the library, checksummed on the way in
 def addNewMusic():
-    print('newAddMusic')
-    # Perform new add music tasks here
+    import sqlite3
+    import ingest
+    source = filedialog.askdirectory(title="Select New Music Directory")
+    if not source:
+        return
+    logger.info('Add new music started.')
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    settings = current_settings()
+    cursor = sqliteConnection.cursor()
+    cursor.execute(settings.library.checksumtable)
+    totals = {}
+    for file, status, error in ingest.ingest(cursor, source, settings,
+                                             settings.ingest.workers,
+                                             settings.ingest.verify):
+        totals[status] = totals.get(status, 0) + 1
+        if status != 'ingested':
+            logger.warning(f"Add new music {status}: {file} {error or ''}")
+    sqliteConnection.close()
+    logger.info(f"Add new music ended: {totals}")
+
+    child_window = Toplevel()
+    child_window.title('Add New Music')
+    for status in ('ingested', 'exists', 'verify-failed', 'unchecked', 'error'):
+        ttk.Label(child_window, text=f"{status}: {totals.get(status, 0)}", font=13).pack()
+
+# convert a directory tree to WAV, one decoder per core
+def menu_convertWav():
+    import convert
+    from library import scan_files
+    source = filedialog.askdirectory(title="Select Music Directory")
+    if not source:
+        return
+    output_dir = filedialog.askdirectory(title="Select WAV Output Directory")
+    if not output_dir:
+        return
+    settings = current_settings()
+    jobs, skipped = convert.plan_jobs(settings.formats, scan_files(source, ','.join(settings.library.filetypes)),
+                                      output_dir, source)
+    for file_path, reason in skipped:
+        logger.warning(f"Convert skipped: {file_path}: {reason}")
+    logger.info(f"Convert to WAV started, {len(jobs)} files, {len(skipped)} skipped.")
+
+    child_window = Toplevel()
+    child_window.title('Convert to WAV')
+    progress = ttk.Progressbar(child_window, length=580, maximum=max(len(jobs), 1))
+    progress.pack(padx=10, pady=10)
+    label = ttk.Label(child_window, text='', font=13)
+    label.pack()
+    failed = 0
+    for done, (file_path, output, error) in enumerate(convert.convert_files(settings.formats, jobs), 1):
+        if error:
+            failed += 1
+            logger.error(f"Convert failed: {file_path}: {error}")
+        progress['value'] = done
+        label['text'] = f"{done}/{len(jobs)} converted, {failed} failed, {len(skipped)} skipped"
+        child_window.update()
+    logger.info(f"Convert to WAV ended, {failed} failed.")
+
+# tracks that sound the same (FLAC and MP3 copies, albums ripped twice)
+def menu_findDuplicateAudio():
+    import sqlite3
+    import fingerprint
+    from library import scan_files
+    if fingerprint.np is None:
+        messagebox.showerror('Find Duplicate Audio', 'Audio fingerprints need NumPy (pip install numpy).')
+        return
+    libpath = filedialog.askdirectory(title="Select Music Directory")
+    if not libpath:
+        return
+    settings = current_settings()
+    section = settings.fingerprint
+    files = list(scan_files(libpath, ','.join(settings.library.filetypes)))
+    logger.info(f"Find duplicate audio started, {len(files)} files.")
+
+    child_window = Toplevel()
+    child_window.title('Find Duplicate Audio')
+    progress = ttk.Progressbar(child_window, length=580, maximum=max(len(files), 1))
+    progress.pack(padx=10, pady=10)
+    label = ttk.Label(child_window, text='', font=13)
+    label.pack()
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    # unchanged files keep their fingerprint, only new ones are decoded
+    for done, (file_path, error) in enumerate(fingerprint.fingerprint_files(
+            cursor, settings.formats, files, section.workers or None, section.start, section.seconds,
+            libpath=libpath), 1):
+        if error:
+            logger.warning(f"Fingerprint skipped: {file_path}: {error}")
+        progress['value'] = done
+        label['text'] = f"{done}/{len(files)} fingerprinted"
+        child_window.update()
+    progress['value'] = len(files)
+
+    names, vectors, bits = fingerprint.load_fingerprints(cursor, libpath)
+    sqliteConnection.close()
+    tree = ttk.Treeview(child_window, columns=('kind', 'similarity', 'file', 'duplicate'), show='headings')
+    for column, width in (('kind', 100), ('similarity', 80), ('file', 400), ('duplicate', 400)):
+        tree.heading(column, text=column.capitalize())
+        tree.column(column, width=width, stretch=column in ('file', 'duplicate'))
+    tree.pack(fill='both', expand=True)
+    pairs = 0
+    for file_a, file_b, cosine, ber, kind in fingerprint.find_duplicates(names, vectors, bits,
+                                                                         section.similarity, section.maxber):
+        pairs += 1
+        tree.insert('', 'end', values=(kind, f"{1 - ber:.2f}", file_a, file_b))
+        logger.info(f"Duplicate audio ({kind}, {1 - ber:.2f}): {file_a} = {file_b}")
+    label['text'] = f"{len(names)} tracks, {pairs} duplicate pairs"
+    logger.info(f"Find duplicate audio ended, {pairs} pairs.")
+
+# read the structure of every file (no decoding), suspect files first
+def menu_integrityStructure():
+    import structcheck
+    from library import scan_files
+    libpath = filedialog.askdirectory(title="Select Music Directory")
+    if not libpath:
+        return
+    settings = current_settings()
+    section = settings.structcheck
+    files = list(scan_files(libpath, ','.join(settings.library.filetypes)))
+    logger.info(f"Structure check started, {len(files)} files.")
+
+    child_window = Toplevel()
+    child_window.title('Structure Check')
+    progress = ttk.Progressbar(child_window, length=580, maximum=max(len(files), 1))
+    progress.pack(padx=10, pady=10)
+    label = ttk.Label(child_window, text='', font=13)
+    label.pack()
+    results = []
+    for done, (file_path, problems) in enumerate(structcheck.check_files(
+            files, section.workers or None, section.samples), 1):
+        results.append((file_path, problems))
+        progress['value'] = done
+        label['text'] = f"{done}/{len(files)} checked"
+        child_window.update()
+
+    tree = ttk.Treeview(child_window, columns=('kind', 'offset', 'file', 'detail'), show='headings')
+    for column, width in (('kind', 80), ('offset', 90), ('file', 420), ('detail', 300)):
+        tree.heading(column, text=column.capitalize())
+        tree.column(column, width=width, stretch=column in ('file', 'detail'))
+    tree.pack(fill='both', expand=True)
+    suspect = 0
+    for file_path, problems in structcheck.verify_order(results):
+        problems = [problem for problem in problems if problem.kind != 'unchecked']
+        if not problems:
+            break
+        suspect += 1
+        for problem in problems:
+            tree.insert('', 'end', values=(problem.kind, problem.offset, file_path, problem.detail))
+            logger.warning(f"Structure {problem.kind}: {file_path} @{problem.offset}: {problem.detail}")
+    label['text'] = f"{len(files)} files checked, {suspect} suspect"
+    logger.info(f"Structure check ended, {suspect} suspect files.")
 
 # fileQuit
 def fileQuit():
@@ -45,88 +192,326 @@ def integrityVerify():
     # Perform integrity verification tasks here
     logger.info('Integrity verifier ended.')
 
-def string_to_hex(input_string):
-    # First, encode the string to bytes
-    bytes_data = input_string.encode('utf-8')
-
-    # Then, convert bytes to hex
-    hex_data = bytes_data.hex()
-
-    return hex_data
-
 # integrityParanoid will calculate the checksum of each music file 
 # and compare it to the stored checksum (inside an sqlite database)
 def menu_integrityChecksum():
-    # read configuration ini file
-    config = configparser.ConfigParser()
-    config.read('musiclibmanager.ini')
-
-    # set logging
-    logger = logging.getLogger(__name__)
-    #logging.basicConfig(filename='example.log', encoding='utf-8', level=logging.DEBUG)
-    logging.basicConfig(filename=config['APP']['logfile'], 
-                        format='%(asctime)s - %(levelname)s - %(message)s', 
-                        level=logging.DEBUG)
+    import sqlite3
+    import merkle
+    from applog import FILES_LOGGER
+    from checksum import hash_files
+    from hashcache import cache_from_config
+    from iosched import scheduler_from_config
+    from library import scan_files
+    from metrics import Metrics, start_reporter
+    from throttle import throttle_from_config
+    settings = current_settings()
+
     logger.info('Integrity Calc-Checksum started.')
 
     child_window = Toplevel()
     canvas = Canvas(child_window, height=500, width=600)
     canvas.pack()
 
-    libpath = config['LIBRARY']['location']
+    libpath = settings.library.location
     #libpath = filedialog.askopenfilename(title="Select Library Directory", filetype=(('text files''*.txt'),('all files','*.*')))
     libpath = filedialog.askdirectory()
     ttk.Label(child_window, text=libpath, font=13).pack()
     logger.debug(f"Library path: {libpath}")
     # include cover images in the checksum calculation
-    if config['COVER']['imagenames']:
-        scanfiletypes = config['LIBRARY']['filetypes'] + ','+ config['COVER']['imagenames']
-    else:
-        scanfiletypes = config['LIBRARY']['filetypes']
+    scanfiletypes = settings.library.scanfiletypes
     logger.debug(f"Library file types: {scanfiletypes}")
-    checksumtype = config['LIBRARY']['checksumtype']
+    checksumtype = settings.library.checksumtype
     logger.debug(f"Library checksum type: {checksumtype}")
 
     sqliteConnection = sqlite3.connect('./data/paranoid.db')
     cursor = sqliteConnection.cursor()
 
     # create checksum table if not exists
-    cursor.execute(config['LIBRARY']['checksumtable'])
+    cursor.execute(settings.library.checksumtable)
     cursor.connection.commit()
     
-    #  erase all previous records (SQLite does not have TRUNCATE TABLE command)
-    cursor.execute("DELETE FROM checksum;")
+    # erase the previous snapshot of this libpath only, the snapshots of
+    # the other trees (source and destination of a compare) are kept
+    cursor.execute(merkle.CHUNKTABLE)
+    cursor.execute("DELETE FROM chunks WHERE file IN (SELECT file FROM checksum WHERE libpath = ?)", (libpath,))
+    cursor.execute("DELETE FROM checksum WHERE libpath = ?", (libpath,))
     cursor.connection.commit()
 
-    # check all files in the library
-    for root, dirnames, filenames in os.walk(libpath):
-        for extensions in scanfiletypes.split(','):
-            for filename in fnmatch.filter(filenames, extensions):
-                logger.debug(os.path.join(root, filename))
-                # calculate checksum
-                chksum=get_sha256_hash(os.path.join(root, filename))
-                error=FALSE
-
-                if error is None or not str(error).strip():
-                    logger.error(f"Checksum error: {error}")
-                else:
-                    logger.debug(f"Checksum: {chksum}")
-                    cursor.execute("INSERT INTO checksum (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)",
-                                   (libpath, os.path.join(root, filename), checksumtype,chksum))
-                    cursor.connection.commit()
-
+    # optional chunk level hash trees, to locate damage inside big files
+    chunksize = None
+    if settings.merkle.enabled:
+        chunksize = settings.merkle.chunksize
+
+    # digests of files unchanged since the last run ([CACHE] section)
+    cache = cache_from_config(settings.cache, sqliteConnection, checksumtype)
+
+    # per stage timers, logged every [METRICS] interval seconds
+    metrics = Metrics()
+    reporter = start_reporter(settings.metrics, metrics, 'Calc CheckSums')
+
+    def scan():
+        files = scan_files(libpath, settings.library.match)
+        while True:
+            with metrics.timer('scan'):
+                file_path = next(files, None)
+            if file_path is None:
+                return
+            yield file_path
+
+    # check all files in the library (hashed in parallel by the checksum engine)
+    filelog = logging.getLogger(FILES_LOGGER)
+    perfile = filelog.isEnabledFor(logging.DEBUG)
+    scheduler = scheduler_from_config(settings.iosched)
+    throttle = throttle_from_config(settings.throttle)
+    for file_path, chksum, error, *leaves in hash_files(scan(), checksumtype, metrics=metrics,
+                                                        scheduler=scheduler, throttle=throttle,
+                                                        chunksize=chunksize, cache=cache):
+        if error:
+            logger.error(f"Checksum error: {file_path}: {error}")
+        else:
+            if perfile:
+                filelog.debug(f"Checksum: {chksum} {file_path}")
+            with metrics.timer('db'):
+                cursor.execute("INSERT OR REPLACE INTO checksum (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)",
+                               (libpath, file_path, checksumtype, chksum))
+                if leaves:
+                    merkle.store_tree(cursor, file_path, checksumtype, chunksize, leaves[0])
+                cursor.connection.commit()
+
+    reporter.stop()
     sqliteConnection.close()
     logger.debug("Integrity check completed.")
 
+# hash the [DISTRIBUTED] nodes, each by the worker running next to its disks
+def menu_integrityChecksumNodes():
+    import sqlite3
+    import distributed
+    settings = current_settings()
+    section = settings.distributed
+    nodes = distributed.nodes_from_config(section)
+    if not nodes:
+        messagebox.showinfo('Calc CheckSums (Nodes)', 'No nodes in the [DISTRIBUTED] section.')
+        return
+    logger.info(f"Distributed checksums started, {len(nodes)} nodes.")
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    cursor.execute(settings.library.checksumtable)
+    failed = 0
+    for libpath, file_path, error in distributed.collect(cursor, nodes, settings.library.checksumtype,
+                                                         section.token, timeout=section.timeout):
+        failed += 1
+        logger.error(f"Distributed checksum error: {file_path or libpath}: {error}")
+    sqliteConnection.close()
+    logger.info(f"Distributed checksums ended, {failed} errors.")
+
+# write per-album manifests (sha256sum/b2sum format) from the checksum table
+def menu_manifestExport():
+    import sqlite3
+    import manifest
+    libpath = filedialog.askdirectory(title="Select Library Directory")
+    if not libpath:
+        return
+    logger.info('Manifest export started.')
+    settings = current_settings()
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    count = manifest.export_album_manifests(cursor, libpath,
+                                            settings.manifest.name,
+                                            settings.manifest.style)
+    sqliteConnection.close()
+    logger.info(f"Manifest export ended, {count} manifests written.")
+
+# load the .sha256/.md5/.ffp manifests found in the album folders
+def menu_manifestImport():
+    import sqlite3
+    import manifest
+    libpath = filedialog.askdirectory(title="Select Library Directory")
+    if not libpath:
+        return
+    logger.info('Manifest import started.')
+    settings = current_settings()
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    cursor.execute(settings.library.checksumtable)
+    count = manifest.import_manifests(cursor, libpath, settings.manifest.batchsize)
+    sqliteConnection.close()
+    logger.info(f"Manifest import ended, {count} checksums imported.")
+
+# verify a copy (destination) against the checksums of its source
+def menu_manifestVerify():
+    import sqlite3
+    import manifest
+    libpath = filedialog.askdirectory(title="Select Source Directory")
+    if not libpath:
+        return
+    destpath = filedialog.askdirectory(title="Select Destination Directory")
+    if not destpath:
+        return
+    logger.info('Manifest verify started.')
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    totals = {}
+    for file, status, expected, actual in manifest.verify_checksums(cursor, libpath, destpath,
+                                                                    formats=current_settings().formats):
+        totals[status] = totals.get(status, 0) + 1
+        if status != 'ok':
+            logger.warning(f"Manifest {status}: {file}")
+    sqliteConnection.close()
+    logger.info(f"Manifest verify ended: {totals}")
+
+    child_window = Toplevel()
+    child_window.title('Verify Against Manifest')
+    for status in ('ok', 'mismatch', 'missing', 'error', 'unchecked'):
+        ttk.Label(child_window, text=f"{status}: {totals.get(status, 0)}", font=13).pack()
+
+# write a manifest (digest, size, mtime) into every album directory
+def menu_albumManifestWrite():
+    import manifest
+    libpath = filedialog.askdirectory(title="Select Library Directory")
+    if not libpath:
+        return
+    logger.info('Album manifests started.')
+    settings = current_settings()
+    albums = 0
+    for manifest_path, count, errors in manifest.write_album_manifests(
+            libpath, settings.library.match, settings.library.checksumtype):
+        albums += 1
+        if errors:
+            logger.error(f"Album manifest {manifest_path}: {errors} files could not be read")
+    logger.info(f"Album manifests ended, {albums} albums.")
+
+# verify a tree against its own album manifests (no paranoid.db needed)
+def menu_albumManifestVerify():
+    import manifest
+    libpath = filedialog.askdirectory(title="Select Directory To Verify")
+    if not libpath:
+        return
+    logger.info('Album manifest verify started.')
+    totals = {}
+    for manifest_path, results in manifest.verify_album_manifests(
+            libpath, current_settings().manifest.workersperdevice):
+        for file, status in results:
+            totals[status] = totals.get(status, 0) + 1
+            if status != 'ok':
+                logger.warning(f"Album manifest {status}: {file}")
+    logger.info(f"Album manifest verify ended: {totals}")
+
+    child_window = Toplevel()
+    child_window.title('Verify Album Manifests')
+    for status in ('ok', 'mismatch', 'missing', 'error'):
+        ttk.Label(child_window, text=f"{status}: {totals.get(status, 0)}", font=13).pack()
+
+# re-verify tonight's slice of the library ([SCRUB] section)
+def menu_integrityScrub():
+    import sqlite3
+    import scrub
+    from iosched import scheduler_from_config
+    from throttle import throttle_from_config
+    settings = current_settings()
+    # the tree as Calc CheckSums stored it
+    libpath = filedialog.askdirectory(title="Select Library Directory", initialdir=settings.library.location)
+    if not libpath:
+        return
+    logger.info('Scrub started.')
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    totals = {}
+    for file, status in scrub.scrub_from_config(cursor, settings.scrub, libpath,
+                                                scheduler=scheduler_from_config(settings.iosched),
+                                                throttle=throttle_from_config(settings.throttle)):
+        totals[status] = totals.get(status, 0) + 1
+        if status != 'ok':
+            logger.warning(f"Scrub {status}: {file}")
+    sqliteConnection.close()
+    logger.info(f"Scrub ended: {totals}")
+
+# copy only the missing/mismatched files from source to destination
+def menu_integritySync():
+    import sqlite3
+    import sync
+    source = filedialog.askdirectory(title="Select Source Directory")
+    if not source:
+        return
+    destination = filedialog.askdirectory(title="Select Destination Directory")
+    if not destination:
+        return
+    logger.info('Sync started.')
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    totals = {}
+    settings = current_settings()
+    for rel, status, error in sync.sync(cursor, source, destination,
+                                        settings.sync.workers, settings.sync.method):
+        totals[status] = totals.get(status, 0) + 1
+        if status not in ('copied', 'resynced'):
+            logger.error(f"Sync {status}: {rel} {error or ''}")
+    sqliteConnection.close()
+    logger.info(f"Sync ended: {totals}")
+
+    child_window = Toplevel()
+    child_window.title('Sync Destination')
+    for status in ('copied', 'resynced', 'source-mismatch', 'unverifiable', 'error'):
+        ttk.Label(child_window, text=f"{status}: {totals.get(status, 0)}", font=13).pack()
+
+# compare the source and destination checksum snapshots, results in a
+# paged viewer (the comparison table keeps the last result)
+def menu_integrityCompare():
+    import sqlite3
+    import merkle
+    import paranoid
+    from Toplevel_results import show_results
+    source = filedialog.askdirectory(title="Select Source Directory")
+    if not source:
+        return
+    destination = filedialog.askdirectory(title="Select Destination Directory")
+    if not destination:
+        return
+    logger.info('Paranoid compare started.')
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    count = paranoid.store_comparison(cursor, paranoid.compare_checksums(cursor, source, destination))
+    # files hashed with chunk trees ([MERKLE]) get their damaged ranges named
+    cursor.execute(merkle.CHUNKTABLE)
+    for rel, ranges in merkle.compare_trees(cursor, source, destination):
+        if ranges is not None:
+            logger.warning(f"Paranoid mismatch {rel}, damaged ranges: {merkle.describe_ranges(ranges)}")
+    logger.info(f"Paranoid compare ended, {count} differences.")
+    show_results(root, sqliteConnection)
+
+def menu_integrityResults():
+    import sqlite3
+    import paranoid
+    from Toplevel_results import show_results
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    for sql in paranoid.COMPARISONTABLE:
+        sqliteConnection.execute(sql)
+    show_results(root, sqliteConnection)
+
 def menu_integrityParanoid():
+    from Toplevel_paranoid import Toplevel_paranoid
     global paranoid_window
-    paranoid_window = IntegrityParanoid()
+    paranoid_window = Toplevel_paranoid(Toplevel(root))
 
 # main #
 
-# read configuration ini file
-config = configparser.ConfigParser()
-config.read('musiclibmanager.ini')
+# read and validate the configuration ini file, a bad value stops the
+# application here instead of in the middle of a scan
+try:
+    settings = load_config('musiclibmanager.ini')
+except ConfigError as error:
+    Tk().withdraw()
+    messagebox.showerror('Music Library Manager', 'Configuration errors:\n' + '\n'.join(error.errors))
+    sys.exit(1)
+
+def current_settings():
+    # re-parsed only when musiclibmanager.ini changed since the last call;
+    # an invalid edit keeps the last good settings
+    global settings
+    try:
+        settings = load_config('musiclibmanager.ini')
+    except ConfigError as error:
+        logger.error(f"Configuration not reloaded: {error}")
+    return settings
 
 # Initialize the application 
 root = Tk()
@@ -138,20 +523,35 @@ root.title('Music Library Manager')
 root.option_add('*tearOff', FALSE)
 menu_bar = Menu(root)
 
-
-# background image
-bg = PhotoImage(file = "bg_music.png")
-
-# Show image using label
-labelbg = Label( root, image = bg)
+# background image: a copy downscaled to the window size is cached in
+# data/, loaded once the window is on screen
+BACKGROUND = 'bg_music.png'
+BACKGROUND_CACHE = './data/bg_music.762x508.png'
+labelbg = Label(root)
 labelbg.place(x = 0, y = 0)
 
-# set logging
+def load_background():
+    global bg
+    try:
+        if os.path.getmtime(BACKGROUND_CACHE) >= os.path.getmtime(BACKGROUND):
+            bg = PhotoImage(file = BACKGROUND_CACHE)
+            labelbg.configure(image = bg)
+            return
+    except OSError:
+        pass
+    full = PhotoImage(file = BACKGROUND)
+    # integer subsample factor so the image still covers the window
+    factor = max(1, min(full.width() // 762, full.height() // 508))
+    bg = full.subsample(factor)
+    labelbg.configure(image = bg)
+    try:
+        bg.write(BACKGROUND_CACHE, format = 'png')
+    except TclError as error:
+        logger.warning(f"Background cache not written: {error}")
+
+# set logging (once, [APP] loglevel/logperfile/logmaxsize)
+setup_logging(settings.app)
 logger = logging.getLogger(__name__)
-#logging.basicConfig(filename='example.log', encoding='utf-8', level=logging.DEBUG)
-logging.basicConfig(filename=config['APP']['logfile'], 
-                        format='%(asctime)s - %(levelname)s - %(message)s', 
-                        level=logging.DEBUG)
 logger.info('Music Library Manager started')
 
 # create the File and Edit menus
@@ -165,6 +565,15 @@ menubar.add_cascade(menu=menu_integrity, label='Integrity')
 menubar.add_cascade(menu=menu_cover, label='Cover')
 
 # add a menu item to the menu
+menu_file.add_command(
+    label='Add New Music',
+    command=addNewMusic)
+menu_file.add_command(
+    label='Convert to WAV',
+    command=menu_convertWav)
+menu_file.add_command(
+    label='Find Duplicate Audio',
+    command=menu_findDuplicateAudio)
 menu_file.add_command(
     label='Exit',
     command=root.destroy)
@@ -174,11 +583,55 @@ menu_integrity.add_command(
     label='Calc CheckSums',
     command=menu_integrityChecksum)
 
+menu_integrity.add_command(
+    label='Calc CheckSums (Nodes)',
+    command=menu_integrityChecksumNodes)
+menu_integrity.add_command(
+    label='Compare Snapshots',
+    command=menu_integrityCompare)
+menu_integrity.add_command(
+    label='Comparison Results',
+    command=menu_integrityResults)
+menu_integrity.add_command(
+    label='Sync Destination',
+    command=menu_integritySync)
+menu_integrity.add_command(
+    label='Scrub Now',
+    command=menu_integrityScrub)
+menu_integrity.add_command(
+    label='Structure Check',
+    command=menu_integrityStructure)
+menu_integrity.add_separator()
+menu_integrity.add_command(
+    label='Import Manifests',
+    command=menu_manifestImport)
+menu_integrity.add_command(
+    label='Export Manifests',
+    command=menu_manifestExport)
+menu_integrity.add_command(
+    label='Verify Against Manifest',
+    command=menu_manifestVerify)
+menu_integrity.add_command(
+    label='Write Album Manifests',
+    command=menu_albumManifestWrite)
+menu_integrity.add_command(
+    label='Verify Album Manifests',
+    command=menu_albumManifestVerify)
+
 #integrityItem = integrityMenu.add_command(label='&Verify Integrity', command=integrityVerify)
 integrityItem = menu_integrity.add_command(
     label='Integrity Paranoid Mode', 
     command=menu_integrityParanoid)
 
+def started():
+    load_background()
+    logger.info(f"Startup took {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+    # used by startup.py to measure the cold start
+    if '--exit-after-startup' in sys.argv:
+        root.after(1, root.destroy)
+
+root.after_idle(started)
+
 # Start the event loop 
 root.mainloop()
 
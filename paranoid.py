@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: paranoid.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Integrity Paranoid comparison of two checksum snapshots, and
+#              a streaming merge compare of live trees and manifests that
+#              runs in constant memory.
+#
+import heapq
+import itertools
+import os
+import pickle
+import tempfile
+
+from checksum import hash_files_ordered
+from library import filetype_matcher
+from manifest import read_manifest
+
+# Both snapshots live in the checksum table, one per libpath. Files are
+# matched on their path relative to libpath.
+COMPARE_SQL = """
+WITH s AS (SELECT substr(file, length(libpath) + 2) AS rel, chksum FROM checksum WHERE libpath = ?),
+     d AS (SELECT substr(file, length(libpath) + 2) AS rel, chksum FROM checksum WHERE libpath = ?)
+SELECT s.rel, CASE WHEN d.rel IS NULL THEN 'missing' ELSE 'mismatch' END, s.chksum, d.chksum
+  FROM s LEFT JOIN d ON d.rel = s.rel
+ WHERE d.rel IS NULL OR d.chksum <> s.chksum
+UNION ALL
+SELECT d.rel, 'extra', NULL, d.chksum
+  FROM d LEFT JOIN s ON s.rel = d.rel
+ WHERE s.rel IS NULL
+"""
+
+# the last comparison, kept for the results viewer (Toplevel_results.py)
+COMPARISONTABLE = (
+    'CREATE TABLE IF NOT EXISTS "comparison" ("rel" TEXT NOT NULL, "status" TEXT NOT NULL, '
+    '"album" TEXT NOT NULL, "format" TEXT NOT NULL, "source_chksum" TEXT, "dest_chksum" TEXT)',
+    'CREATE INDEX IF NOT EXISTS "comparison_rel" ON "comparison" ("rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_status" ON "comparison" ("status", "rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_album" ON "comparison" ("album", "rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_format" ON "comparison" ("format", "rel")',
+    # a status and/or format filter sorted by another column (Toplevel_results)
+    'CREATE INDEX IF NOT EXISTS "comparison_status_album" ON "comparison" ("status", "album", "rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_status_format" ON "comparison" ("status", "format", "rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_format_album" ON "comparison" ("format", "album", "rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_format_status" ON "comparison" ("format", "status", "rel")',
+    'CREATE INDEX IF NOT EXISTS "comparison_status_format_album" ON "comparison" '
+    '("status", "format", "album", "rel")',
+)
+
+
+def compare_checksums(cursor, source, destination):
+    """Compare the checksums of source against destination.
+
+    Yields (relative_path, status, source_chksum, destination_chksum) for
+    every difference, status is 'missing' (not in destination), 'extra'
+    (only in destination) or 'mismatch'.
+    """
+    yield from cursor.execute(COMPARE_SQL, (source, destination))
+
+
+def store_comparison(cursor, differences, batchsize=10000, moves=True):
+    """Replace the comparison table with differences (rows as yielded by
+    compare_checksums() or merge_compare()). Returns the row count.
+
+    With moves, missing and extra files holding the same content are
+    marked as moved (see mark_moves())."""
+    # own cursor, differences may still be reading from the caller's one
+    cursor = cursor.connection.cursor()
+    # indexes are dropped during the bulk insert and built once at the end
+    cursor.execute(COMPARISONTABLE[0])
+    cursor.execute("DELETE FROM comparison;")
+    for sql in COMPARISONTABLE[1:]:
+        cursor.execute("DROP INDEX IF EXISTS " + sql.split('"')[1])
+    count = 0
+    batch = []
+    for rel, status, source_chksum, dest_chksum in differences:
+        batch.append((rel, status, os.path.dirname(rel), os.path.splitext(rel)[1].lstrip('.').lower(),
+                      source_chksum, dest_chksum))
+        if len(batch) >= batchsize:
+            cursor.executemany("INSERT INTO comparison VALUES (?, ?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+            batch = []
+    cursor.executemany("INSERT INTO comparison VALUES (?, ?, ?, ?, ?, ?)", batch)
+    count += len(batch)
+    for sql in COMPARISONTABLE[1:]:
+        cursor.execute(sql)
+    if moves:
+        mark_moves(cursor)
+    cursor.connection.commit()
+    return count
+
+
+def mark_moves(cursor):
+    """Pair the missing and extra rows of the comparison table by checksum.
+
+    A file missing in the destination whose content is there under
+    another path becomes 'moved-from' (both checksums set), that other
+    path 'moved-to'. Returns the number of moved-from rows.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS moved_chksums (chksum TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM moved_chksums")
+    cursor.execute("INSERT INTO moved_chksums SELECT source_chksum FROM comparison WHERE status = 'missing' "
+                   "INTERSECT SELECT dest_chksum FROM comparison WHERE status = 'extra'")
+    cursor.execute("UPDATE comparison SET status = 'moved-from', dest_chksum = source_chksum "
+                   "WHERE status = 'missing' AND source_chksum IN (SELECT chksum FROM moved_chksums)")
+    moved = cursor.rowcount
+    cursor.execute("UPDATE comparison SET status = 'moved-to', source_chksum = dest_chksum "
+                   "WHERE status = 'extra' AND dest_chksum IN (SELECT chksum FROM moved_chksums)")
+    return moved
+
+
+def path_key(rel):
+    # tuple of path components: the order a sorted depth first walk yields
+    return tuple(rel.split('/'))
+
+
+def walk_sorted(libpath, filetypes=None):
+    """Yield the relative path of every file below libpath in path_key order.
+
+    Only one directory listing per level is held in memory. filetypes is
+    the comma delimited pattern list of the ini file or a matcher made by
+    library.filetype_matcher() (None = all files).
+    """
+    match = filetype_matcher(filetypes) if isinstance(filetypes, str) else filetypes
+
+    def walk(directory, prefix):
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path, prefix + entry.name + '/')
+            elif match is None or match(entry.name):
+                yield prefix + entry.name
+
+    yield from walk(libpath, '')
+
+
+def external_sort(items, key, chunk=200000):
+    """Sort an iterable that may not fit in memory.
+
+    Runs of `chunk` items are sorted and spilled to temporary files, then
+    merged with heapq.merge. Inputs smaller than one chunk never touch the
+    disk.
+    """
+    runs = []
+    try:
+        while True:
+            block = sorted(itertools.islice(items, chunk), key=key)
+            if not block:
+                break
+            if not runs and len(block) < chunk:
+                yield from block
+                return
+            run = tempfile.TemporaryFile()
+            for item in block:
+                pickle.dump(item, run)
+            run.seek(0)
+            runs.append(run)
+
+        def read(run):
+            while True:
+                try:
+                    yield pickle.load(run)
+                except EOFError:
+                    return
+
+        yield from heapq.merge(*(read(run) for run in runs), key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def manifest_entries(manifest_path, chunk=200000):
+    """(relative_path, chksum) of a manifest in path_key order."""
+    entries = ((name[2:] if name.startswith('./') else name, chksum)
+               for name, chksumtype, chksum in read_manifest(manifest_path))
+    return external_sort(entries, key=lambda entry: path_key(entry[0]), chunk=chunk)
+
+
+def live_entries(libpath, filetypes=None, checksumtype='sha256', workers=None):
+    """(relative_path, chksum) of a live tree in path_key order, hashed on the fly."""
+    rels = walk_sorted(libpath, filetypes)
+    paths = (os.path.join(libpath, rel) for rel in rels)
+    for file_path, chksum, error in hash_files_ordered(paths, checksumtype, workers):
+        yield os.path.relpath(file_path, libpath), chksum if error is None else None
+
+
+def merge_compare(source, destination):
+    """Single merge-join pass over two (relative_path, chksum) streams
+    sorted in path_key order.
+
+    Memory is constant, differences are yielded as soon as they are found,
+    as (relative_path, status, source_chksum, destination_chksum) like
+    compare_checksums(). A file that could not be read has chksum None and
+    is reported as a mismatch.
+    """
+    source, destination = iter(source), iter(destination)
+    s, d = next(source, None), next(destination, None)
+    while s is not None or d is not None:
+        if d is None or (s is not None and path_key(s[0]) < path_key(d[0])):
+            yield s[0], 'missing', s[1], None
+            s = next(source, None)
+        elif s is None or path_key(d[0]) < path_key(s[0]):
+            yield d[0], 'extra', None, d[1]
+            d = next(destination, None)
+        else:
+            if s[1] is None or s[1] != d[1]:
+                yield s[0], 'mismatch', s[1], d[1]
+            s, d = next(source, None), next(destination, None)
+
+
+def entries_for(path, filetypes=None, checksumtype='sha256', workers=None):
+    """Stream for a compare side: a manifest file or a live directory."""
+    if os.path.isfile(path):
+        return manifest_entries(path)
+    return live_entries(path, filetypes, checksumtype, workers)
+
+
+if __name__ == '__main__':
+    # compare two sides without paranoid.db, each a directory or a manifest:
+    #   python3 paranoid.py /mnt/music/all.sha256 /mnt/backup/music
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Streaming compare of directories and manifests.')
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    parser.add_argument('--filetypes', default='*.flac,*.dsf,*.mp3,cover.jpg,folder.jpg')
+    parser.add_argument('--checksumtype', default='sha256')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    differences = 0
+    for rel, status, source_chksum, dest_chksum in merge_compare(
+            entries_for(args.source, args.filetypes, args.checksumtype, args.workers),
+            entries_for(args.destination, args.filetypes, args.checksumtype, args.workers)):
+        differences += 1
+        print(f"{status.upper()}: {rel}", flush=True)
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: scrub.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Rolling scrub. Every run re-verifies a slice of the checksum
+#              table (files that failed before first, then never verified,
+#              then the oldest), so the whole library is checked within
+#              [SCRUB] windowdays at a constant nightly cost. Meant for cron:
+#
+#   30 1 * * * cd /opt/musiclibmanager && python3 scrub.py
+#
+import logging
+import os
+import time
+
+from checksum import hash_files
+from merkle import CHUNKTABLE, describe_ranges, load_tree, verify_tree
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+# the scrub state has its own table: Calc CheckSums replaces the checksum
+# rows of a libpath on every run, the verification history must survive it
+SCRUBTABLE = ('CREATE TABLE IF NOT EXISTS "scrub_state" ("file" TEXT NOT NULL, "last_verified" REAL, '
+              '"failures" INTEGER NOT NULL DEFAULT 0, PRIMARY KEY("file"))')
+# failed files first, then never verified (NULL sorts first), then oldest
+# (.ffp rows hold the FLAC audio MD5, they can not be re-hashed)
+SELECT = ("SELECT c.file, c.chksumtype, c.chksum FROM checksum c LEFT JOIN scrub_state s ON s.file = c.file "
+          "WHERE c.libpath = ? AND c.chksumtype <> 'ffp' "
+          "ORDER BY coalesce(s.failures, 0) > 0 DESC, s.last_verified ASC")
+UPDATE = ("INSERT INTO scrub_state (file, last_verified, failures) VALUES (?, ?, CASE WHEN ? THEN 0 ELSE 1 END) "
+          "ON CONFLICT(file) DO UPDATE SET last_verified = excluded.last_verified, "
+          "failures = CASE WHEN excluded.failures = 0 THEN 0 ELSE failures + 1 END")
+
+
+def ensure_table(cursor):
+    """Create the scrub_state table; the state kept in the checksum columns
+    of earlier versions is carried over once."""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scrub_state'").fetchone()
+    cursor.execute(SCRUBTABLE)
+    cursor.execute('CREATE INDEX IF NOT EXISTS "checksum_libpath" ON "checksum" ("libpath")')
+    if not exists:
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info("checksum")')}
+        if {'last_verified', 'failures'} <= columns:
+            cursor.execute("INSERT OR IGNORE INTO scrub_state SELECT file, last_verified, failures FROM checksum "
+                           "WHERE last_verified IS NOT NULL OR failures > 0")
+    cursor.connection.commit()
+
+
+def scrub(cursor, libpath, percent=None, gigabytes=None, seconds=None, batchsize=1000, **engine):
+    """Re-verify one slice of libpath.
+
+    The slice ends at whichever budget runs out first: percent of the files,
+    gigabytes read or seconds elapsed (None = no limit). engine keywords
+    (workers, metrics, scheduler, throttle) go to checksum.hash_files.
+    Yields (file, status) with status 'ok', 'mismatch', 'missing' or
+    'error'; every verified file gets last_verified in scrub_state,
+    failures counts the consecutive failed scrubs. The damaged ranges of a mismatched file
+    with a chunk tree are logged.
+    """
+    ensure_table(cursor)
+    cursor.execute(CHUNKTABLE)
+    limit = -1
+    if percent is not None:
+        total = cursor.execute("SELECT count(*) FROM checksum WHERE libpath = ? AND chksumtype <> 'ffp'", (libpath,)).fetchone()[0]
+        limit = max(1, int(total * percent / 100 + 0.5))
+    deadline = time.monotonic() + seconds if seconds else None
+    byte_budget = gigabytes * GB if gigabytes else None
+
+    by_type = {}
+    expected = {}
+    budget = {'read': 0}
+
+    def files(chksumtype):
+        for file_path in by_type[chksumtype]:
+            if deadline and time.monotonic() >= deadline:
+                return
+            if byte_budget is not None:
+                try:
+                    size = os.path.getsize(file_path)
+                except OSError:
+                    size = 0
+                if budget['read'] and budget['read'] + size > byte_budget:
+                    return
+                budget['read'] += size
+            yield file_path
+
+    # the slice is picked up front (ordered by priority), then hashed per
+    # checksum type with the parallel engine
+    for file_path, chksumtype, chksum in cursor.execute(SELECT + " LIMIT ?", (libpath, limit)).fetchall():
+        by_type.setdefault(chksumtype, []).append(file_path)
+        expected[file_path] = chksum
+    if not expected:
+        logger.warning(f"Scrub: no checksums stored for {libpath}, run Calc CheckSums on it first")
+
+    updates = []
+    for chksumtype in by_type:
+        for file_path, actual, error in hash_files(files(chksumtype), chksumtype, **engine):
+            if isinstance(error, FileNotFoundError):
+                status = 'missing'
+            elif error:
+                status = 'error'
+            else:
+                status = 'ok' if actual == expected[file_path] else 'mismatch'
+            if status == 'mismatch':
+                _log_damage(cursor, file_path)
+            updates.append((file_path, time.time(), status == 'ok'))
+            if len(updates) >= batchsize:
+                _update(cursor, updates)
+                updates = []
+            yield file_path, status
+    if updates:
+        _update(cursor, updates)
+
+
+def _log_damage(cursor, file_path):
+    # name the damaged ranges, they can be resynced alone (sync.py)
+    tree = load_tree(cursor, file_path)
+    if tree is None:
+        return
+    chksumtype, chunksize, root, leaves = tree
+    try:
+        ranges = verify_tree(file_path, chksumtype, chunksize, leaves, stop_at_first=False)
+    except OSError:
+        return
+    logger.warning(f"Scrub damaged ranges of {file_path}: {describe_ranges(ranges)}")
+
+
+def _update(cursor, updates):
+    cursor.executemany(UPDATE, updates)
+    cursor.connection.commit()
+
+
+def scrub_from_config(cursor, settings, libpath, **engine):
+    """Run scrub() of libpath with the budgets of the [SCRUB] settings
+    (appconfig.ScrubSettings).
+
+    Without an explicit percent, 100 / windowdays percent is checked per
+    run so every file is verified once per window.
+    """
+    percent = settings.percent or 100.0 / settings.windowdays
+    seconds = settings.maxhours * 3600 if settings.maxhours else None
+    return scrub(cursor, libpath, percent, settings.gigabytes or None, seconds, **engine)
+
+
+if __name__ == '__main__':
+    import sqlite3
+    import sys
+
+    from appconfig import ConfigError, load_config
+    from applog import setup_logging
+    from iosched import scheduler_from_config
+    from metrics import Metrics, start_reporter
+    from throttle import throttle_from_config
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        settings = load_config('musiclibmanager.ini')
+    except ConfigError as error:
+        sys.exit(str(error))
+    setup_logging(settings.app)
+
+    libpath = sys.argv[1] if len(sys.argv) > 1 else settings.library.location
+    logger.info('Scrub started.')
+    metrics = Metrics()
+    reporter = start_reporter(settings.metrics, metrics, 'Scrub')
+    sqliteConnection = sqlite3.connect('./data/paranoid.db')
+    cursor = sqliteConnection.cursor()
+    totals = {}
+    for file_path, status in scrub_from_config(cursor, settings.scrub, libpath, metrics=metrics,
+                                               scheduler=scheduler_from_config(settings.iosched),
+                                               throttle=throttle_from_config(settings.throttle)):
+        totals[status] = totals.get(status, 0) + 1
+        if status != 'ok':
+            logger.warning(f"Scrub {status}: {file_path}")
+    sqliteConnection.close()
+    reporter.stop()
+    logger.info(f"Scrub ended: {totals}")
+    sys.exit(1 if any(status != 'ok' for status in totals) else 0)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: startup.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Startup time report. Starts the application under
+#              python -X importtime, lets it close itself once the main
+#              window is up (--exit-after-startup) and prints the wall time
+#              and the slowest imports.
+#
+#   python3 startup.py --top 15
+#
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Return [(cumulative_us, self_us, depth, module)] from -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            imports.append((int(match.group(2)), int(match.group(1)), depth, match.group(4)))
+    return imports
+
+
+def measure(script='musiclibmanager.py', args=('--exit-after-startup',)):
+    """Run script under -X importtime, returns (wall_seconds, imports, returncode)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', script, *args],
+                            cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True)
+    wall = time.perf_counter() - start
+    return wall, parse_importtime(result.stderr), result.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup time of musiclibmanager.')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports shown')
+    parser.add_argument('--script', default='musiclibmanager.py')
+    args = parser.parse_args()
+
+    wall, imports, returncode = measure(args.script)
+    total = sum(self_us for cumulative, self_us, depth, module in imports)
+    print(f"startup (process start to window shown and closed): {wall * 1000:.0f} ms")
+    print(f"imports: {len(imports)} modules, {total / 1000:.1f} ms")
+    if returncode:
+        print(f"warning: {args.script} exited with code {returncode}")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    top_level = [entry for entry in imports if entry[2] == 0]
+    for cumulative, self_us, depth, module in sorted(top_level, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:14.1f} {self_us / 1000:8.1f}  {module}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Filename: structcheck.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Fast structural check of music files, no decoding. Finds
+#              truncated files, zero filled blocks left by a bad copy and
+#              broken frames from the file structure alone: FLAC frame
+#              header CRC-8 and a sample of frame CRC-16s, the MP3 frame
+#              sync chain, DSF chunk sizes against the file size. Run it
+#              before flac -t / mpck to check the suspect files first.
+#
+#   python3 structcheck.py /mnt/music
+#   python3 structcheck.py --order /mnt/music | xargs -d '\n' -n1 flac -t
+#
+import mmap
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# kind: 'truncated', 'crc', 'sync', 'zeros', 'structure' or 'unchecked'
+Problem = namedtuple('Problem', 'kind offset detail')
+
+PAGE = 4096
+ZERO_PAGE = bytes(PAGE)
+# FLAC frames sampled for their CRC-16, on top of the first and the last;
+# truncation and zero runs are always found, a flipped bit only when it
+# is in a sampled frame
+FLAC_SAMPLES = 16
+
+
+def _crc_table(poly, width):
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly if crc & top else crc << 1) & mask
+        table.append(crc)
+    return table
+
+
+CRC8_TABLE = _crc_table(0x07, 8)
+CRC16_TABLE = _crc_table(0x8005, 16)
+
+
+def crc8(data):
+    crc = 0
+    table = CRC8_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+def crc16(data):
+    crc = 0
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def zero_runs(mm, start, end, min_size=PAGE):
+    """Yield (offset, size) of the runs of zero bytes of at least min_size
+    (rounded to whole pages) between start and end. Compressed audio never
+    holds a page of zeros; a copy that hit a bad block or a sparse hole does."""
+    pos = start
+    while True:
+        found = mm.find(ZERO_PAGE, pos, end)
+        if found < 0:
+            return
+        run_end = found + PAGE
+        while run_end + PAGE <= end and mm[run_end:run_end + PAGE] == ZERO_PAGE:
+            run_end += PAGE
+        while run_end < end and mm[run_end] == 0:
+            run_end += 1
+        if run_end - found >= min_size:
+            yield found, run_end - found
+        pos = run_end
+
+
+def _id3v2_size(mm):
+    # ID3v2 header: 'ID3', version, flags, syncsafe size (+ footer)
+    if len(mm) >= 10 and mm[:3] == b'ID3':
+        size = 0
+        for byte in mm[6:10]:
+            size = size << 7 | (byte & 0x7F)
+        return 10 + size + (10 if mm[5] & 0x10 else 0)
+    return 0
+
+
+# FLAC #
+
+FLAC_BLOCKSIZES = {1: 192, 2: 576, 3: 1152, 4: 2304, 5: 4608}
+FLAC_RATES = {1: 88200, 2: 176400, 3: 192000, 4: 8000, 5: 16000, 6: 22050, 7: 24000,
+              8: 32000, 9: 44100, 10: 48000, 11: 96000}
+FLAC_BITS = {1: 8, 2: 12, 4: 16, 5: 20, 6: 24, 7: 32}
+StreamInfo = namedtuple('StreamInfo', 'min_blocksize max_blocksize max_framesize rate channels bits total_samples')
+FlacFrame = namedtuple('FlacFrame', 'offset number blocksize variable')
+
+
+def flac_frame_header(mm, pos, info):
+    """Parse the frame header at pos, returns a FlacFrame or None when it
+    is not a valid header (sync, reserved values, CRC-8, or values that
+    disagree with STREAMINFO)."""
+    if pos + 6 > len(mm) or mm[pos] != 0xFF or mm[pos + 1] & 0xFE != 0xF8:
+        return None
+    variable = mm[pos + 1] & 1
+    blocksize_code, rate_code = mm[pos + 2] >> 4, mm[pos + 2] & 0x0F
+    channels_code, bits_code, reserved = mm[pos + 3] >> 4, (mm[pos + 3] >> 1) & 7, mm[pos + 3] & 1
+    if blocksize_code == 0 or rate_code == 15 or channels_code > 10 or bits_code == 3 or reserved:
+        return None
+    if rate_code in FLAC_RATES and FLAC_RATES[rate_code] != info.rate:
+        return None
+    if bits_code in FLAC_BITS and FLAC_BITS[bits_code] != info.bits:
+        return None
+    if (channels_code + 1 if channels_code < 8 else 2) != info.channels:
+        return None
+    # the frame or sample number, UTF-8 style coded: the leading ones of
+    # the first byte give the length
+    first = mm[pos + 4]
+    length = 8 - (first ^ 0xFF).bit_length()
+    if length == 1 or length > 7:
+        return None
+    number = first & (0xFF >> (length + 1)) if length else first
+    length = max(length, 1)
+    cursor = pos + 5
+    for _ in range(length - 1):
+        if cursor >= len(mm) or mm[cursor] & 0xC0 != 0x80:
+            return None
+        number = number << 6 | (mm[cursor] & 0x3F)
+        cursor += 1
+    if blocksize_code == 6:
+        blocksize, cursor = mm[cursor] + 1, cursor + 1
+    elif blocksize_code == 7:
+        blocksize, cursor = int.from_bytes(mm[cursor:cursor + 2], 'big') + 1, cursor + 2
+    elif blocksize_code >= 8:
+        blocksize = 256 << (blocksize_code - 8)
+    else:
+        blocksize = FLAC_BLOCKSIZES[blocksize_code]
+    cursor += {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+    if cursor >= len(mm) or crc8(mm[pos:cursor]) != mm[cursor]:
+        return None
+    return FlacFrame(pos, number, blocksize, variable)
+
+
+def _flac_next(mm, frame, info, limit):
+    # the frame that must follow frame: same blocking, next number
+    expected = frame.number + (frame.blocksize if frame.variable else 1)
+    pos = frame.offset + 6
+    while True:
+        pos = mm.find(b'\xff', pos, limit)
+        if pos < 0:
+            return None
+        following = flac_frame_header(mm, pos, info)
+        if following is not None and following.number == expected and following.variable == frame.variable:
+            return following
+        pos += 1
+
+
+def _flac_find(mm, pos, info, limit):
+    # the first valid frame header at or after pos
+    while True:
+        pos = mm.find(b'\xff', pos, limit)
+        if pos < 0:
+            return None
+        frame = flac_frame_header(mm, pos, info)
+        if frame is not None:
+            return frame
+        pos += 1
+
+
+def check_flac(mm, samples=FLAC_SAMPLES):
+    problems = []
+    start = _id3v2_size(mm)
+    if mm[start:start + 4] != b'fLaC':
+        return [Problem('structure', start, 'no fLaC marker')]
+    pos, info, last = start + 4, None, False
+    while not last:
+        if pos + 4 > len(mm):
+            return [Problem('truncated', pos, 'file ends inside the metadata blocks')]
+        last, kind = mm[pos] & 0x80, mm[pos] & 0x7F
+        length = int.from_bytes(mm[pos + 1:pos + 4], 'big')
+        if kind == 0:
+            fields = int.from_bytes(mm[pos + 14:pos + 22], 'big')
+            info = StreamInfo(*struct.unpack('>HH', mm[pos + 4:pos + 8]),
+                              int.from_bytes(mm[pos + 11:pos + 14], 'big'),
+                              fields >> 44, ((fields >> 41) & 7) + 1, ((fields >> 36) & 0x1F) + 1,
+                              fields & 0xFFFFFFFFF)
+        pos += 4 + length
+    if info is None:
+        return [Problem('structure', start + 4, 'no STREAMINFO block')]
+    audio = pos
+    if audio >= len(mm):
+        return [Problem('truncated', audio, 'no audio frames')]
+    # an ID3v1 tag may trail the audio
+    end = len(mm) - 128 if len(mm) - 128 > audio and mm[len(mm) - 128:len(mm) - 125] == b'TAG' else len(mm)
+    reach = (info.max_framesize or 1024 * 1024) * 2 + 16
+
+    def check_frame(frame):
+        following = _flac_next(mm, frame, info, min(end, frame.offset + reach))
+        if following is not None:
+            frame_end = following.offset
+        else:
+            first_sample = frame.number * (1 if frame.variable else info.max_blocksize)
+            if info.total_samples and first_sample + frame.blocksize < info.total_samples:
+                problems.append(Problem('sync', frame.offset,
+                                        f"no frame after sample {first_sample} (damaged data)"))
+                return
+            frame_end = end
+        if crc16(mm[frame.offset:frame_end - 2]) != int.from_bytes(mm[frame_end - 2:frame_end], 'big'):
+            problems.append(Problem('crc', frame.offset, 'frame CRC-16 mismatch'))
+
+    first = flac_frame_header(mm, audio, info)
+    if first is None:
+        problems.append(Problem('sync', audio, 'no frame header at the start of the audio'))
+    else:
+        check_frame(first)
+    # a sample of frames spread over the file
+    step = (end - audio) // (samples + 1)
+    for i in range(1, samples + 1 if step > reach else 0):
+        frame = _flac_find(mm, audio + i * step, info, min(end, audio + i * step + reach))
+        if frame is None:
+            problems.append(Problem('sync', audio + i * step, 'no valid frame header'))
+        else:
+            check_frame(frame)
+
+    # the last frame must end the stream at total_samples
+    pos, frame = end, None
+    while frame is None:
+        pos = mm.rfind(b'\xff', max(audio, end - reach), pos)
+        if pos < 0:
+            break
+        frame = flac_frame_header(mm, pos, info)
+    if frame is None:
+        problems.append(Problem('truncated', end, 'no frame header near the end'))
+    else:
+        last_sample = frame.number * (1 if frame.variable else info.max_blocksize) + frame.blocksize
+        if info.total_samples and last_sample < info.total_samples:
+            problems.append(Problem('truncated', frame.offset,
+                                    f"audio ends at sample {last_sample} of {info.total_samples}"))
+        elif frame.offset != audio:
+            check_frame(frame)
+    problems.extend(Problem('zeros', offset, f"{size} zero bytes") for offset, size in zero_runs(mm, audio, end))
+    return problems
+
+
+# MP3 #
+
+MP3_BITRATES = {  # (mpeg1, layer) -> kbit/s by index
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_BITRATES[(False, 3)] = MP3_BITRATES[(False, 2)]
+MP3_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mp3_frame_length(mm, pos):
+    """Length of the MPEG audio frame at pos, None when pos holds no valid
+    header, 0 for free format (length unknown)."""
+    if pos + 4 > len(mm) or mm[pos] != 0xFF or mm[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version, layer = (mm[pos + 1] >> 3) & 3, 4 - ((mm[pos + 1] >> 1) & 3)
+    bitrate_index, rate_index, padding = mm[pos + 2] >> 4, (mm[pos + 2] >> 2) & 3, (mm[pos + 2] >> 1) & 1
+    if version == 1 or layer == 4 or bitrate_index == 15 or rate_index == 3:
+        return None
+    if bitrate_index == 0:
+        return 0
+    mpeg1 = version == 3
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    rate = MP3_RATES[version][rate_index]
+    if layer == 1:
+        return (12 * bitrate // rate + padding) * 4
+    return (144 if mpeg1 or layer == 2 else 72) * bitrate // rate + padding
+
+
+def _mp3_xing_frames(mm, pos):
+    # frame count of a Xing/Info header in the first frame, or None
+    mpeg1, mono = (mm[pos + 1] >> 3) & 3 == 3, mm[pos + 3] >> 6 == 3
+    tag = pos + 4 + ((17 if mono else 32) if mpeg1 else (9 if mono else 17))
+    if mm[tag:tag + 4] in (b'Xing', b'Info') and mm[tag + 7] & 1:
+        return int.from_bytes(mm[tag + 8:tag + 12], 'big')
+    return None
+
+
+def check_mp3(mm):
+    problems = []
+    audio = _id3v2_size(mm)
+    end = len(mm)
+    if end - 128 >= audio and mm[end - 128:end - 125] == b'TAG':
+        end -= 128
+    if end - 32 >= audio and mm[end - 32:end - 24] == b'APETAGEX':
+        end -= int.from_bytes(mm[end - 20:end - 16], 'little') + 32
+    if audio >= end:
+        return [Problem('truncated', audio, 'no audio after the ID3 tag')]
+
+    pos, frames, xing, lost_at = audio, 0, None, None
+    while pos < end:
+        length = mp3_frame_length(mm, pos)
+        if length == 0:
+            return problems + [Problem('unchecked', pos, 'free format bitrate')]
+        if length is None:
+            # resync on two chained frames
+            if lost_at is None:
+                lost_at = pos
+            pos = mm.find(b'\xff', pos + 1, end)
+            while pos >= 0:
+                length = mp3_frame_length(mm, pos)
+                if length and mp3_frame_length(mm, pos + length) is not None:
+                    break
+                pos = mm.find(b'\xff', pos + 1, end)
+            if pos < 0:
+                problems.append(Problem('sync', lost_at, f"no frames in the last {end - lost_at} bytes"))
+                break
+            continue
+        if lost_at is not None:
+            problems.append(Problem('sync', lost_at, f"frame sync lost for {pos - lost_at} bytes"))
+            lost_at = None
+        if frames == 0:
+            xing = _mp3_xing_frames(mm, pos)
+        if pos + length > end:
+            problems.append(Problem('truncated', pos, f"last frame is {pos + length - end} bytes short"))
+        frames += 1
+        pos += length
+    if frames == 0:
+        problems.append(Problem('structure', audio, 'no MPEG audio frames'))
+    elif xing is not None and abs((frames - 1) - xing) > 1:
+        problems.append(Problem('truncated', pos, f"{frames - 1} frames, the Xing header says {xing}"))
+    problems.extend(Problem('zeros', offset, f"{size} zero bytes") for offset, size in zero_runs(mm, audio, end))
+    return problems
+
+
+# DSF #
+
+def check_dsf(mm):
+    if len(mm) < 92 or mm[:4] != b'DSD ' or mm[28:32] != b'fmt ':
+        return [Problem('structure', 0, 'no DSD/fmt chunks')]
+    dsd_size, total_size, metadata = struct.unpack('<QQQ', mm[4:28])
+    fmt_size = struct.unpack('<Q', mm[32:40])[0]
+    channels, rate, bits, sample_count, block_size = struct.unpack('<IIIQI', mm[52:76])
+    problems = []
+    if total_size != len(mm):
+        kind = 'truncated' if total_size > len(mm) else 'structure'
+        problems.append(Problem(kind, len(mm), f"file is {len(mm)} bytes, the DSD chunk says {total_size}"))
+    data = 28 + fmt_size
+    if mm[data:data + 4] != b'data':
+        return problems + [Problem('structure', data, 'no data chunk after fmt')]
+    data_size = struct.unpack('<Q', mm[data + 4:data + 12])[0]
+    data_end = data + data_size
+    if data_end > len(mm):
+        problems.append(Problem('truncated', len(mm), f"data chunk is {data_end - len(mm)} bytes short"))
+    if metadata and metadata != data_end:
+        problems.append(Problem('structure', metadata, f"metadata pointer {metadata}, data ends at {data_end}"))
+    blocks = -(-sample_count // (block_size * 8)) if block_size else 0
+    if block_size and data_size - 12 != blocks * block_size * channels:
+        problems.append(Problem('structure', data, f"data chunk holds {data_size - 12} bytes, "
+                                                   f"{sample_count} samples need {blocks * block_size * channels}"))
+    # DSD silence is 0x69, zeros only come from a bad copy
+    problems.extend(Problem('zeros', offset, f"{size} zero bytes")
+                    for offset, size in zero_runs(mm, data + 12, min(data_end, len(mm))))
+    return problems
+
+
+CHECKERS = {'.flac': check_flac, '.mp3': check_mp3, '.dsf': check_dsf}
+
+
+def check_file(file_path, samples=FLAC_SAMPLES):
+    """Return the structural problems of file_path ([] when none found),
+    samples is the number of FLAC frames whose CRC-16 is checked."""
+    extension = os.path.splitext(file_path)[1].lower()
+    checker = CHECKERS.get(extension)
+    if checker is None:
+        return [Problem('unchecked', 0, 'no structural check for this format')]
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return [Problem('truncated', 0, 'empty file')]
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                return checker(mm, samples) if extension == '.flac' else checker(mm)
+    except (OSError, ValueError, IndexError, struct.error) as error:
+        return [Problem('structure', 0, f"{type(error).__name__}: {error}")]
+
+
+def check_files(file_paths, workers=None, samples=FLAC_SAMPLES):
+    """Check file_paths in a thread pool, yields (file_path, problems) in
+    completion order with a few files per worker in flight."""
+    workers = workers or os.cpu_count() or 1
+    pending = {}
+    paths = iter(file_paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < workers * 4:
+                file_path = next(paths, None)
+                if file_path is None:
+                    break
+                pending[executor.submit(check_file, file_path, samples)] = file_path
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def verify_order(results):
+    """Order (file_path, problems) results for the full decode checks:
+    files with problems first, the most serious kinds first."""
+    severity = {'truncated': 0, 'crc': 1, 'sync': 2, 'zeros': 3, 'structure': 4, 'unchecked': 5}
+    return sorted(results, key=lambda result: (min((severity[p.kind] for p in result[1]), default=9),
+                                               result[0]))
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from library import scan_files
+
+    parser = argparse.ArgumentParser(description='Structural check of FLAC, MP3 and DSF files (no decoding).')
+    parser.add_argument('paths', nargs='+', help='files or directories')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--samples', type=int, default=FLAC_SAMPLES, help='FLAC frames CRC-16 checked per file')
+    parser.add_argument('--order', action='store_true',
+                        help='print every file, suspect ones first, for the decode checks')
+    args = parser.parse_args()
+
+    def files():
+        for path in args.paths:
+            if os.path.isdir(path):
+                yield from scan_files(path, '*.flac,*.mp3,*.dsf')
+            else:
+                yield path
+
+    results = check_files(files(), args.workers, args.samples)
+    if args.order:
+        for file_path, problems in verify_order(results):
+            print(file_path)
+        sys.exit(0)
+    bad = 0
+    for file_path, problems in results:
+        problems = [p for p in problems if p.kind != 'unchecked']
+        if problems:
+            bad += 1
+            for problem in problems:
+                print(f"{problem.kind.upper()} {file_path} @{problem.offset}: {problem.detail}", flush=True)
+    sys.exit(1 if bad else 0)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: sync.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Repair a backup from its source. Only the files a paranoid
+#              compare reports as missing or mismatched are copied, every
+#              copy is checksummed while it is written, lands under a
+#              temporary name and is renamed into place once verified.
+#              A mismatched file with a chunk tree (merkle.py) only gets
+#              its damaged chunks rewritten, in a temporary copy as well.
+#
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from checksum import hash_constructor, new_hash, hex_digest, get_file_hash
+from merkle import CHUNKTABLE, describe_ranges, load_tree, resync_chunks, store_tree, verify_tree
+from paranoid import compare_checksums
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCKSIZE = 8 * 1024 * 1024
+TMP_SUFFIX = '.musiclib-tmp'
+UPSERT = "INSERT OR REPLACE INTO checksum (libpath,file,chksumtype,chksum) VALUES (?, ?, ?, ?)"
+
+
+def _copy_tee(fd_in, fd_out, checksumtype, blocksize):
+    # one read of the source: every block is hashed and written
+    hash_obj = new_hash(checksumtype)
+    buffer = bytearray(blocksize)
+    view = memoryview(buffer)
+    while True:
+        size = os.readv(fd_in, [buffer])
+        if not size:
+            break
+        hash_obj.update(view[:size])
+        written = 0
+        while written < size:
+            written += os.write(fd_out, view[written:size])
+    return hex_digest(hash_obj)
+
+
+def _copy_zerocopy(fd_in, fd_out, size):
+    # the data never enters user space; copy_file_range can even reflink
+    # on filesystems that support it, sendfile is the fallback
+    offset = 0
+    while offset < size:
+        try:
+            copied = os.copy_file_range(fd_in, fd_out, size - offset)
+        except (AttributeError, OSError):
+            copied = os.sendfile(fd_out, fd_in, offset, size - offset)
+        if not copied:
+            break
+        offset += copied
+
+
+def copy_verified(src, dst, checksumtype='sha256', method='tee', blocksize=COPY_BLOCKSIZE):
+    """Copy src to dst atomically and return the checksum of the copied data.
+
+    method 'tee' hashes the bytes on their way to dst (no second read).
+    method 'zerocopy' uses copy_file_range/sendfile and hashes dst
+    afterwards, which usually comes straight from the page cache. The copy
+    is fsynced under a temporary name; call commit_copy() to rename it into
+    place or discard_copy() to drop it.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = dst + TMP_SUFFIX
+    fd_in = os.open(src, os.O_RDONLY)
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd_in, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        fd_out = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if method == 'zerocopy':
+                _copy_zerocopy(fd_in, fd_out, os.fstat(fd_in).st_size)
+                chksum = None
+            else:
+                chksum = _copy_tee(fd_in, fd_out, checksumtype, blocksize)
+            os.fsync(fd_out)
+        finally:
+            os.close(fd_out)
+    finally:
+        os.close(fd_in)
+    if chksum is None:
+        chksum = get_file_hash(tmp, checksumtype)
+    shutil.copystat(src, tmp)
+    return chksum
+
+
+def commit_copy(dst):
+    os.replace(dst + TMP_SUFFIX, dst)
+
+
+def discard_copy(dst):
+    try:
+        os.remove(dst + TMP_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def _resync(src, dst, checksumtype, expected, tree):
+    # the chunks of dst that differ from the source tree are rewritten in a
+    # copy of dst (copy_file_range, a reflink where the filesystem can do
+    # it), renamed into place once it has the expected checksum
+    chksumtype, chunksize, root, leaves = tree
+    if chksumtype != checksumtype or not os.path.isfile(dst):
+        return False
+    ranges = verify_tree(dst, chksumtype, chunksize, leaves, stop_at_first=False)
+    logger.info(f"Resync {dst}: {describe_ranges(ranges)}")
+    fd_in = os.open(dst, os.O_RDONLY)
+    try:
+        fd_out = os.open(dst + TMP_SUFFIX, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            _copy_zerocopy(fd_in, fd_out, os.fstat(fd_in).st_size)
+        finally:
+            os.close(fd_out)
+    finally:
+        os.close(fd_in)
+    resync_chunks(src, dst + TMP_SUFFIX, ranges)
+    if get_file_hash(dst + TMP_SUFFIX, checksumtype) != expected:
+        discard_copy(dst)
+        return False
+    shutil.copystat(src, dst + TMP_SUFFIX)
+    commit_copy(dst)
+    return True
+
+
+def _repair(source, destination, rel, checksumtype, expected, method, tree=None):
+    src = os.path.join(source, rel)
+    dst = os.path.join(destination, rel)
+    try:
+        if tree is not None and _resync(src, dst, checksumtype, expected, tree):
+            return rel, 'resynced', None, checksumtype, expected
+        chksum = copy_verified(src, dst, checksumtype, method)
+    except (OSError, ValueError) as error:
+        discard_copy(dst)
+        return rel, 'error', str(error), checksumtype, None
+    if chksum != expected:
+        # the source no longer matches its own snapshot, don't spread it
+        discard_copy(dst)
+        return rel, 'source-mismatch', None, checksumtype, chksum
+    commit_copy(dst)
+    return rel, 'copied', None, checksumtype, chksum
+
+
+def sync(cursor, source, destination, workers=4, method='tee'):
+    """Copy the missing and mismatched files of a paranoid compare from
+    source to destination, and update both checksum snapshots.
+
+    Yields (relative_path, status, error) with status 'copied',
+    'resynced' (only the damaged chunks of a mismatched file were
+    rewritten, the source has a chunk tree), 'source-mismatch' (the source
+    file no longer has its recorded checksum, nothing is copied),
+    'unverifiable' (the source row is not a file checksum, e.g. an
+    imported .ffp, nothing is copied) or 'error'. Files only present in
+    the destination ('extra') are left alone.
+    """
+    cursor.execute(CHUNKTABLE)
+    work = []
+    for rel, status, source_chksum, dest_chksum in compare_checksums(cursor, source, destination):
+        if status in ('missing', 'mismatch'):
+            row = cursor.connection.execute("SELECT chksumtype FROM checksum WHERE file = ?",
+                                            (os.path.join(source, rel),)).fetchone()
+            try:
+                hash_constructor(row[0])
+            except ValueError:
+                # .ffp rows (manifest.py) hold the FLAC audio MD5, a copy
+                # can not be checked against it
+                yield rel, 'unverifiable', f"no file checksum ({row[0]})"
+                continue
+            tree = load_tree(cursor.connection.cursor(), os.path.join(source, rel))
+            work.append((rel, row[0], source_chksum, status, tree))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_repair, source, destination, rel, checksumtype, expected, method,
+                                   tree if status == 'mismatch' else None)
+                   for rel, checksumtype, expected, status, tree in work]
+        for future, (_, _, _, _, tree) in zip(futures, work):
+            rel, status, error, checksumtype, chksum = future.result()
+            if status in ('copied', 'resynced'):
+                cursor.executemany(UPSERT, [(source, os.path.join(source, rel), checksumtype, chksum),
+                                            (destination, os.path.join(destination, rel), checksumtype, chksum)])
+                if tree is not None:
+                    # same bytes, same tree
+                    store_tree(cursor, os.path.join(destination, rel), tree[0], tree[1], tree[3])
+                cursor.connection.commit()
+            yield rel, status, error
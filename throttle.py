@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Filename: throttle.py
+# Author: Jon Arce (jon.arce@gmail.com)
+# Date: 2026-10-19
+# Description: Rate limiting for the checksum engine so integrity scans can
+#              run while the box is serving music: MB/s and files/s caps,
+#              idle I/O class / nice for the workers and a backoff when the
+#              disk read latency goes up.
+#
+import ctypes
+import logging
+import os
+import platform
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# linux/ioprio.h
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+SYS_IOPRIO_SET = {'x86_64': 251, 'i686': 289, 'aarch64': 30, 'armv7l': 314}
+
+
+class TokenBucket(object):
+    """Classic token bucket, rate tokens per second with a burst of one second."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount):
+        """Take amount tokens, sleeping as long as needed. Returns the seconds slept."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+def set_idle_priority():
+    """Put the calling thread in the idle I/O class and at nice 19 (Linux)."""
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except (AttributeError, OSError) as error:
+        logger.debug(f"nice not available: {error}")
+    number = SYS_IOPRIO_SET.get(platform.machine())
+    if number is None:
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(number, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) != 0:
+        logger.debug(f"ioprio_set failed: {os.strerror(ctypes.get_errno())}")
+
+
+class Throttle(object):
+    """Shared by all hash workers.
+
+    mbps / filesps cap the throughput (0 = no cap). When latency (seconds)
+    is set, a read slower than that doubles a per read delay (up to
+    maxdelay), fast reads halve it again.
+    """
+
+    def __init__(self, mbps=0, filesps=0, idle=False, latency=0, maxdelay=0.5):
+        self.bytes = TokenBucket(mbps * MB) if mbps else None
+        self.files = TokenBucket(filesps) if filesps else None
+        self.idle = idle
+        self.latency = latency
+        self.maxdelay = maxdelay
+        self.delay = 0.0
+        self._local = threading.local()
+
+    def start_file(self):
+        """Called by a worker before each file, returns the seconds slept."""
+        if self.idle and not getattr(self._local, 'idle', False):
+            set_idle_priority()
+            self._local.idle = True
+        return self.files.take(1) if self.files else 0.0
+
+    def read(self, nbytes, latency):
+        """Called after each read, returns the seconds slept."""
+        slept = self.bytes.take(nbytes) if self.bytes else 0.0
+        if self.latency:
+            if latency > self.latency:
+                self.delay = min(self.maxdelay, max(self.delay * 2, 0.005))
+            else:
+                self.delay /= 2
+                if self.delay < 0.001:
+                    self.delay = 0.0
+            if self.delay:
+                time.sleep(self.delay)
+                slept += self.delay
+        return slept
+
+
+def throttle_from_config(settings):
+    """Create a Throttle from the [THROTTLE] settings (appconfig.ThrottleSettings),
+    None when nothing is limited."""
+    if not (settings.mbps or settings.filesps or settings.idle or settings.latencyms):
+        return None
+    return Throttle(settings.mbps, settings.filesps, settings.idle, settings.latencyms / 1000,
+                    settings.maxdelayms / 1000)